@@ -0,0 +1,207 @@
+"""Регрессионный бенчмарк страниц приложения posts.
+
+Запускается только при YATUBE_BENCHMARK=1, например:
+
+    YATUBE_BENCHMARK=1 pytest tests/test_benchmark.py -s
+
+Объём данных задаётся переменными BENCHMARK_POSTS, BENCHMARK_USERS,
+BENCHMARK_FOLLOWS, число прогонов каждой страницы - BENCHMARK_ROUNDS.
+Для каждого адреса из posts/urls.py измеряются число SQL-запросов,
+p50/p95 времени ответа и размер ответа. Холодные прогоны (queries,
+p50_ms, p95_ms, bytes) идут с пустым кэшем: перед каждым кэш очищается,
+и страница строится заново. Тёплые прогоны (warm_queries, warm_p50_ms,
+warm_p95_ms) идут подряд и читают кэш страниц. Тест падает, если результат
+превышает бюджет из tests/benchmark_budget.json. Путь к файлу бюджета
+можно переопределить BENCHMARK_BUDGET, а отчёт сохранить в файл
+BENCHMARK_REPORT.
+"""
+import json
+import os
+import random
+import statistics
+import time
+from io import StringIO
+from urllib.parse import urlencode
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from mixer.backend.django import mixer
+
+from posts import feed
+from posts.models import Comment, Follow, Group, Post
+from posts.urls import app_name, urlpatterns
+from posts.utils import bulk_create_chunked
+
+pytestmark = pytest.mark.skipif(
+    not os.getenv('YATUBE_BENCHMARK'),
+    reason='Бенчмарк запускается при YATUBE_BENCHMARK=1',
+)
+
+POSTS = int(os.getenv('BENCHMARK_POSTS', 100_000))
+USERS = int(os.getenv('BENCHMARK_USERS', 10_000))
+FOLLOWS = int(os.getenv('BENCHMARK_FOLLOWS', 1_000_000))
+ROUNDS = int(os.getenv('BENCHMARK_ROUNDS', 20))
+COMMENTS = 100
+GROUPS = 20
+CHUNK_SIZE = 5000
+# GET-параметры страниц, которым они нужны.
+QUERY_PARAMS = {
+    'search': {'q': 'пост 777'},
+    'personal': {'author': 'BenchmarkTarget'},
+    'profile_archive': {'format': 'html'},
+}
+# Аргументы адресов, отличные от общих: архив отдаётся только владельцу.
+URL_KWARGS = {'profile_archive': {'username': 'BenchmarkReader'}}
+BUDGET_PATH = os.getenv(
+    'BENCHMARK_BUDGET',
+    os.path.join(os.path.dirname(__file__), 'benchmark_budget.json'),
+)
+
+
+def seed_follows(user_ids, follows_count):
+    """Подписывает каждого пользователя на случайных авторов так, чтобы
+    всего получилось follows_count уникальных подписок.
+    """
+    per_user = min(follows_count // len(user_ids), len(user_ids) - 1)
+    for user_id in user_ids:
+        for author_id in random.sample(user_ids, per_user + 1):
+            if author_id != user_id:
+                yield Follow(user_id=user_id, author_id=author_id)
+
+
+@pytest.fixture(scope='module')
+def benchmark_data(django_db_setup, django_db_blocker):
+    random.seed(0)
+    with django_db_blocker.unblock():
+        User = get_user_model()
+        reader = User.objects.create_user(username='BenchmarkReader')
+        target = User.objects.create_user(username='BenchmarkTarget')
+        mixer.cycle(USERS).blend(
+            User, username=mixer.sequence('benchmark_user_{0}')
+        )
+        groups = mixer.cycle(GROUPS).blend(
+            Group, slug=mixer.sequence('benchmark-group-{0}')
+        )
+        user_ids = list(User.objects.values_list('pk', flat=True))
+        bulk_create_chunked(
+            Post,
+            (
+                Post(
+                    text=f'Пост для бенчмарка № {i}',
+                    author_id=random.choice(user_ids),
+                    group=random.choice(groups + [None]),
+                ) for i in range(POSTS)
+            ),
+            CHUNK_SIZE,
+        )
+        bulk_create_chunked(
+            Follow,
+            seed_follows(
+                [pk for pk in user_ids if pk != target.pk], FOLLOWS
+            ),
+            CHUNK_SIZE,
+            ignore_conflicts=True,
+        )
+        post = Post.objects.create(
+            text='Пост читателя', author=reader, group=groups[0]
+        )
+        Comment.objects.bulk_create(
+            Comment(
+                post=post,
+                author_id=random.choice(user_ids),
+                text=f'Комментарий № {i}',
+            ) for i in range(COMMENTS)
+        )
+        # bulk_create не отправляет сигналы: досчитываем денормализацию.
+        call_command('rebuild_counters', stdout=StringIO())
+        call_command('rebuild_search_index', stdout=StringIO())
+        for author in User.objects.filter(following__user=reader):
+            feed.backfill(reader, author)
+        yield {
+            'reader': reader,
+            'kwargs': {
+                'slug': groups[0].slug,
+                'post_id': post.pk,
+                'username': target.username,
+            },
+        }
+        # Удаление по объектам с сигналами заняло бы часы.
+        call_command('flush', interactive=False, verbosity=0)
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def measure(client, url, cold):
+    timings, queries, sizes = [], [], []
+    for _ in range(ROUNDS):
+        if cold:
+            cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            started = time.perf_counter()
+            response = client.get(url)
+            # Потоковый ответ формируется при чтении, читаем его в замере.
+            if response.streaming:
+                size = sum(map(len, response.streaming_content))
+            else:
+                size = len(response.content)
+            timings.append((time.perf_counter() - started) * 1000)
+        assert response.status_code in (200, 302), (
+            f'Страница `{url}` вернула код {response.status_code}'
+        )
+        queries.append(len(context))
+        sizes.append(size)
+    return {
+        'queries': max(queries),
+        'p50_ms': round(statistics.median(timings), 2),
+        'p95_ms': round(percentile(timings, 0.95), 2),
+        'bytes': max(sizes),
+    }
+
+
+@pytest.mark.django_db
+def test_posts_views_fit_budget(benchmark_data):
+    with open(BUDGET_PATH, encoding='utf-8') as budget_file:
+        budget = json.load(budget_file)
+    client = Client()
+    client.force_login(benchmark_data['reader'])
+    report = {}
+    for pattern in urlpatterns:
+        kwargs = {
+            name: benchmark_data['kwargs'][name]
+            for name in pattern.pattern.converters
+        }
+        kwargs.update(URL_KWARGS.get(pattern.name, {}))
+        url = reverse(f'{app_name}:{pattern.name}', kwargs=kwargs)
+        if pattern.name in QUERY_PARAMS:
+            url += '?' + urlencode(QUERY_PARAMS[pattern.name])
+        report[pattern.name] = measure(client, url, cold=True)
+        warm = measure(client, url, cold=False)
+        report[pattern.name].update(
+            (f'warm_{metric}', warm[metric])
+            for metric in ('queries', 'p50_ms', 'p95_ms')
+        )
+    for name, result in report.items():
+        print(name, json.dumps(result))
+    if os.getenv('BENCHMARK_REPORT'):
+        with open(os.getenv('BENCHMARK_REPORT'), 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    exceeded = [
+        f'{name}: {metric} = {report[name][metric]} > {limit}'
+        for name, limits in budget.items()
+        for metric, limit in limits.items()
+        if report[name][metric] > limit
+    ]
+    missing = set(report) - set(budget)
+    assert not missing, (
+        f'Для страниц {sorted(missing)} не задан бюджет в `{BUDGET_PATH}`'
+    )
+    assert not exceeded, 'Превышен бюджет:\n' + '\n'.join(exceeded)
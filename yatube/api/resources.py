@@ -0,0 +1,113 @@
+"""Ресурсы JSON API: какие поля можно запросить и как они читаются.
+
+Поле ресурса - набор выражений для values() и необязательное
+преобразование их значений. Выборка строится из полей, перечисленных
+в ?fields=, связанные модели приходят JOIN-ом того же запроса, как при
+select_related, а объекты моделей не создаются вовсе.
+"""
+from collections import namedtuple
+
+from django.core.files.storage import default_storage
+
+from posts.models import Post
+
+Field = namedtuple('Field', 'lookups convert')
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def field(*lookups, convert=None):
+    return Field(lookups, convert)
+
+
+def media_url(name):
+    return default_storage.url(name) if name else None
+
+
+def thumbnail_url(image, thumbnails):
+    if not image:
+        return None
+    return Post(image=image, thumbnails=thumbnails).thumbnail_url
+
+
+class Resource:
+    """Набор полей ресурса; id и поле даты курсора выбираются всегда."""
+
+    def __init__(self, fields, date_field=None):
+        self.fields = fields
+        self.date_field = date_field
+
+    def parse_fields(self, param):
+        """Имена полей из параметра ?fields=, по умолчанию - все."""
+        if not param:
+            return list(self.fields)
+        names = list(dict.fromkeys(
+            name.strip() for name in param.split(',') if name.strip()
+        ))
+        unknown = [name for name in names if name not in self.fields]
+        if unknown:
+            raise ApiError(400, f'Неизвестные поля: {", ".join(unknown)}')
+        return names
+
+    def values(self, queryset, names):
+        """Выборка строк values() со всем нужным для полей names."""
+        lookups = {'id'}
+        if self.date_field:
+            lookups.add(self.date_field)
+        for name in names:
+            lookups.update(self.fields[name].lookups)
+        return queryset.values(*lookups)
+
+    def serialize(self, rows, names):
+        fields = [(name, self.fields[name]) for name in names]
+        result = []
+        for row in rows:
+            item = {}
+            for name, (lookups, convert) in fields:
+                if convert is None:
+                    item[name] = row[lookups[0]]
+                else:
+                    item[name] = convert(*(row[lookup] for lookup in lookups))
+            result.append(item)
+        return result
+
+
+POSTS = Resource(
+    {
+        'id': field('id'),
+        'text': field('text'),
+        'pub_date': field('pub_date'),
+        'author': field('author__username'),
+        'group': field('group__slug'),
+        'comments_count': field('comments_count'),
+        'image': field('image', convert=media_url),
+        'thumbnail': field('image', 'thumbnails', convert=thumbnail_url),
+    },
+    date_field='pub_date',
+)
+GROUPS = Resource({
+    'id': field('id'),
+    'slug': field('slug'),
+    'title': field('title'),
+    'description': field('description'),
+})
+COMMENTS = Resource(
+    {
+        'id': field('id'),
+        'post': field('post_id'),
+        'author': field('author__username'),
+        'text': field('text'),
+        'created': field('created'),
+    },
+    date_field='created',
+)
+FOLLOWS = Resource({
+    'id': field('id'),
+    'user': field('user__username'),
+    'author': field('author__username'),
+})
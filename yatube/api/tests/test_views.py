@@ -0,0 +1,155 @@
+import gzip
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class ApiViewsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='author')
+        cls.reader = User.objects.create(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        cls.posts = [
+            Post.objects.create(
+                text=f'Пост {number}',
+                author=cls.author,
+                group=None if number % 2 else cls.group,
+            )
+            for number in range(25)
+        ]
+        cls.post = cls.posts[-1]
+        Comment.objects.create(post=cls.post, author=cls.reader, text='Да')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def get(self, name, *args, client=None, **params):
+        response = (client or self.client).get(
+            reverse(f'api:{name}', args=args), params
+        )
+        return response.status_code, response.json()
+
+    def test_post_list_walks_with_cursor(self):
+        """Курсор проходит все посты по одному разу от новых к старым."""
+        status, data = self.get('post_list', limit=10)
+        self.assertEqual(status, 200)
+        seen = [post['id'] for post in data['results']]
+        while data['next']:
+            status, data = self.get(
+                'post_list', limit=10, cursor=data['next']
+            )
+            seen += [post['id'] for post in data['results']]
+        self.assertEqual(seen, [post.pk for post in reversed(self.posts)])
+
+    def test_post_fields(self):
+        status, data = self.get('post_detail', self.post.pk)
+        self.assertEqual(status, 200)
+        self.assertEqual(data['author'], 'author')
+        self.assertEqual(data['group'], 'group')
+        self.assertEqual(data['comments_count'], 1)
+        self.assertIsNone(data['image'])
+        self.assertEqual(
+            set(data),
+            {'id', 'text', 'pub_date', 'author', 'group', 'comments_count',
+             'image', 'thumbnail'},
+        )
+
+    def test_sparse_fieldsets(self):
+        """?fields= ограничивает и поля ответа, и выбираемые колонки."""
+        with self.assertNumQueries(1):
+            status, data = self.get('post_list', fields='id,author')
+        self.assertEqual(set(data['results'][0]), {'id', 'author'})
+        status, data = self.get('post_list', fields='id,password')
+        self.assertEqual(status, 400)
+
+    def test_post_batch(self):
+        """Пакет отдаёт посты в порядке запроса и перечисляет
+        ненайденные id; повторный запрос берёт посты из кэша.
+        """
+        cache.clear()
+        ids = [self.posts[3].pk, 0, self.post.pk]
+        with self.assertNumQueries(2):
+            status, data = self.get(
+                'post_batch', ids=','.join(map(str, ids))
+            )
+        self.assertEqual(status, 200)
+        self.assertEqual(
+            [post['id'] for post in data['results']], [ids[0], ids[2]]
+        )
+        self.assertEqual(data['missing'], [0])
+        self.assertEqual(data['results'][1]['comments_count'], 1)
+        Comment.objects.create(post=self.post, author=self.author, text='Ещё')
+        with self.assertNumQueries(2):
+            status, data = self.get(
+                'post_batch', ids=f'{ids[0]},{ids[2]}', fields='id,text'
+            )
+        self.assertEqual(set(data['results'][0]), {'id', 'text'})
+        with self.assertNumQueries(1):
+            status, data = self.get(
+                'post_batch', ids=f'{ids[0]},{ids[2]}',
+                fields='comments_count',
+            )
+        self.assertEqual(data['results'][1]['comments_count'], 2)
+        status, _ = self.get('post_batch', ids='1,x')
+        self.assertEqual(status, 400)
+
+    def test_post_batch_rejects_ids_out_of_range(self):
+        """id больше 64-битного целого - ошибка запроса, а не 500."""
+        for ids in ('99999999999999999999999', f'1,{-2 ** 64}'):
+            with self.subTest(ids=ids):
+                status, data = self.get('post_batch', ids=ids)
+                self.assertEqual(status, 400)
+                self.assertEqual(data['error'], 'ids - числа через запятую')
+
+    def test_filters_and_related_lists(self):
+        status, data = self.get('post_list', group='group', limit=100)
+        self.assertEqual(len(data['results']), 13)
+        status, data = self.get('comment_list', self.post.pk)
+        self.assertEqual(data['results'][0]['text'], 'Да')
+        status, data = self.get('group_detail', 'group')
+        self.assertEqual(data['title'], 'Группа')
+        status, data = self.get('group_list')
+        self.assertEqual([group['slug'] for group in data['results']],
+                         ['group'])
+        status, _ = self.get('post_detail', 0)
+        self.assertEqual(status, 404)
+
+    def test_id_cursor_out_of_range(self):
+        """Курсор по id больше 64-битного целого - ошибка запроса."""
+        for cursor in ('x', str(2 ** 63), '99999999999999999999999'):
+            with self.subTest(cursor=cursor):
+                status, data = self.get('group_list', cursor=cursor)
+                self.assertEqual(status, 400)
+                self.assertEqual(data['error'], 'Неверный курсор')
+        status, _ = self.get('group_list', cursor=str(2 ** 63 - 1))
+        self.assertEqual(status, 200)
+
+    def test_follow_list(self):
+        status, _ = self.get('follow_list')
+        self.assertEqual(status, 401)
+        client = Client()
+        client.force_login(self.reader)
+        status, data = self.get('follow_list', client=client)
+        self.assertEqual(data['results'][0]['author'], 'author')
+        # Чужие подписки не отдаются ни анониму, ни другому пользователю.
+        status, _ = self.get('follow_list', user='reader')
+        self.assertEqual(status, 401)
+        status, data = self.get('follow_list', client=client, user='author')
+        self.assertEqual(data['results'][0]['author'], 'author')
+
+    def test_responses_are_compressed(self):
+        """Без пакета brotli ответ сжимается gzip."""
+        with mock.patch('core.middleware.brotli', None):
+            response = self.client.get(
+                reverse('api:post_list'), HTTP_ACCEPT_ENCODING='gzip, br'
+            )
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn(b'"results"', gzip.decompress(response.content))
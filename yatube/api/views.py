@@ -0,0 +1,192 @@
+"""JSON API версии 1, только чтение.
+
+Списки постов и комментариев листаются курсором по (дата, id), как
+ленты сайта, списки групп и подписок - по id. Параметры: fields -
+поля через запятую, limit - размер страницы, cursor - курсор страницы.
+"""
+from functools import wraps
+
+import orjson
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.decorators import decorator_from_middleware
+from django.views.decorators.http import require_GET
+
+from core.middleware import CompressionMiddleware
+from core.replicas import use_replica
+from posts.models import Comment, Follow, Group, Post
+from posts.utils import MAX_ID, CursorPaginator
+
+from .resources import COMMENTS, FOLLOWS, GROUPS, POSTS, ApiError
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+MAX_BATCH_IDS = 500
+
+compress = decorator_from_middleware(CompressionMiddleware)
+
+
+def json_response(data, status=200):
+    # orjson сам сериализует даты и в разы быстрее json.
+    return HttpResponse(
+        orjson.dumps(data), status=status, content_type='application/json'
+    )
+
+
+def api_view(view):
+    """GET-view API: ошибки ApiError отдаются JSON, ответ сжимается."""
+    @use_replica
+    @compress
+    @require_GET
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        try:
+            return json_response(view(request, *args, **kwargs))
+        except ApiError as error:
+            return json_response({'error': error.message}, error.status)
+    return wrapper
+
+
+def get_limit(request):
+    try:
+        limit = int(request.GET.get('limit', DEFAULT_LIMIT))
+    except ValueError:
+        raise ApiError(400, 'limit должен быть числом')
+    return min(max(limit, 1), MAX_LIMIT)
+
+
+def get_object(resource, queryset, names, **lookup):
+    rows = list(resource.values(queryset.filter(**lookup), names)[:1])
+    if not rows:
+        raise ApiError(404, 'Не найдено')
+    return resource.serialize(rows, names)[0]
+
+
+def paginate(request, resource, queryset):
+    """Страница списка: {'results': [...], 'next': курсор, 'previous':
+    курсор}."""
+    names = resource.parse_fields(request.GET.get('fields'))
+    rows = resource.values(queryset, names)
+    limit = get_limit(request)
+    cursor = request.GET.get('cursor')
+    if resource.date_field:
+        page = CursorPaginator(
+            rows, limit, resource.date_field
+        ).cursor_page(cursor)
+        return {
+            'results': resource.serialize(page, names),
+            'next': page.next_cursor,
+            'previous': page.previous_cursor,
+        }
+    rows = rows.order_by('id')
+    if cursor:
+        if not cursor.isdigit() or int(cursor) > MAX_ID:
+            raise ApiError(400, 'Неверный курсор')
+        rows = rows.filter(id__gt=int(cursor))
+    rows = list(rows[:limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return {
+        'results': resource.serialize(rows, names),
+        'next': str(rows[-1]['id']) if has_more else None,
+        'previous': None,
+    }
+
+
+@api_view
+def post_list(request):
+    posts = Post.objects.all()
+    if request.GET.get('group'):
+        posts = posts.filter(group__slug=request.GET['group'])
+    if request.GET.get('author'):
+        posts = posts.filter(author__username=request.GET['author'])
+    return paginate(request, POSTS, posts)
+
+
+@api_view
+def post_detail(request, post_id):
+    names = POSTS.parse_fields(request.GET.get('fields'))
+    return get_object(POSTS, Post.objects.all(), names, pk=post_id)
+
+
+def post_cache_key(post_id, updated, comments_count):
+    return f'api_post:{post_id}:{updated.isoformat()}:{comments_count}'
+
+
+@api_view
+def post_batch(request):
+    """Посты по списку ?ids= в порядке запроса; ненайденные id
+    перечисляются в missing.
+
+    Версии постов читаются одним запросом по id__in, готовые посты - из
+    кэша одним get_many, а недостающие - вторым запросом по id__in.
+    """
+    names = POSTS.parse_fields(request.GET.get('fields'))
+    try:
+        ids = list(dict.fromkeys(
+            int(post_id) for post_id in request.GET.get('ids', '').split(',')
+            if post_id.strip()
+        ))
+    except ValueError:
+        raise ApiError(400, 'ids - числа через запятую')
+    # Число вне 64-битного целого SQLite не примет.
+    if any(abs(post_id) > MAX_ID for post_id in ids):
+        raise ApiError(400, 'ids - числа через запятую')
+    if len(ids) > MAX_BATCH_IDS:
+        raise ApiError(400, f'Не больше {MAX_BATCH_IDS} id за запрос')
+    keys = {
+        post_id: post_cache_key(post_id, updated, comments_count)
+        for post_id, updated, comments_count in Post.objects.filter(
+            id__in=ids
+        ).values_list('id', 'updated', 'comments_count')
+    }
+    posts = cache.get_many(keys.values())
+    missing = [post_id for post_id, key in keys.items() if key not in posts]
+    if missing:
+        rows = POSTS.values(Post.objects.filter(id__in=missing), POSTS.fields)
+        fresh = {
+            keys[post['id']]: post
+            for post in POSTS.serialize(rows, POSTS.fields)
+            if post['id'] in keys
+        }
+        cache.set_many(fresh, settings.API_POST_CACHE_TIMEOUT)
+        posts.update(fresh)
+    results = []
+    for post_id in ids:
+        post = posts.get(keys.get(post_id))
+        if post is not None:
+            results.append({name: post[name] for name in names})
+    return {
+        'results': results,
+        'missing': [post_id for post_id in ids if post_id not in keys],
+    }
+
+
+@api_view
+def comment_list(request, post_id):
+    if not Post.objects.filter(pk=post_id).exists():
+        raise ApiError(404, 'Не найдено')
+    return paginate(request, COMMENTS, Comment.objects.filter(post=post_id))
+
+
+@api_view
+def group_list(request):
+    return paginate(request, GROUPS, Group.objects.all())
+
+
+@api_view
+def group_detail(request, slug):
+    names = GROUPS.parse_fields(request.GET.get('fields'))
+    return get_object(GROUPS, Group.objects.all(), names, slug=slug)
+
+
+@api_view
+def follow_list(request):
+    """Подписки текущего пользователя; чужие подписки, как и на сайте,
+    не показываются."""
+    if not request.user.is_authenticated:
+        raise ApiError(401, 'Нужна авторизация')
+    return paginate(
+        request, FOLLOWS, Follow.objects.filter(user=request.user)
+    )
@@ -0,0 +1,16 @@
+from django.contrib import admin
+
+from .models import StoredFile, Task
+
+
+@admin.register(Task)
+class TaskAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'name', 'status', 'attempts', 'run_at', 'key')
+    list_filter = ('status', 'name')
+    search_fields = ('name', 'key')
+
+
+@admin.register(StoredFile)
+class StoredFileAdmin(admin.ModelAdmin):
+    list_display = ('name', 'refs')
+    search_fields = ('name',)
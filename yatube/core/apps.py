@@ -1,5 +1,12 @@
 from django.apps import AppConfig
+from django.core.signals import request_started
+from django.db.backends.signals import connection_created
 
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        from . import db
+        connection_created.connect(db.apply_sqlite_pragmas)
+        request_started.connect(db.close_unusable_connections)
@@ -0,0 +1,214 @@
+"""Двухуровневый кэш: LRU в памяти процесса перед общим кэшем.
+
+Общий кэш (файловый или Redis) видят все процессы, а частые чтения
+обслуживает небольшой локальный LRU без обращения к диску или сети.
+Запись, incr, add и delete идут в общий кэш и обновляют локальную копию
+своего процесса; копии в других процессах живут не дольше L1_TIMEOUT
+секунд. Срок записей в общем кэше случайно укорачивается на долю до
+TIMEOUT_JITTER, чтобы записи, созданные разом, не истекали одновременно.
+
+Настройки в OPTIONS: SHARED - алиас общего кэша в CACHES,
+L1_MAX_ENTRIES, L1_TIMEOUT и TIMEOUT_JITTER.
+
+add общего кэша служит межпроцессной блокировкой, поэтому файловый
+общий кэш - FileBasedCache отсюда, в котором add атомарен.
+"""
+import os
+import pickle
+import random
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from django.core.cache import caches
+from django.core.cache.backends import filebased
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.files import locks
+
+STATS = ('l1_hits', 'shared_hits', 'misses')
+PREFIX = 'yatube_cache_'
+MISSING = object()
+
+# Как в LocMemCache, локальный уровень общий для всех потоков процесса,
+# хотя экземпляры бэкенда у каждого потока свои.
+_tiers = {}
+_locks = {}
+_stats = {}
+
+
+class FileBasedCache(filebased.FileBasedCache):
+    """Файловый кэш с атомарным add.
+
+    В Django add проверяет ключ и записывает его отдельными шагами, и два
+    процесса могут оба решить, что ключа нет. Здесь оба шага выполняются
+    под эксклюзивной блокировкой файла ADD_LOCK в каталоге кэша;
+    блокировку снимает ОС, даже если процесс упал.
+    """
+
+    ADD_LOCK = 'add.lock'
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self._createdir()
+        with open(os.path.join(self._dir, self.ADD_LOCK), 'ab') as lock:
+            locks.lock(lock, locks.LOCK_EX)
+            try:
+                return super().add(key, value, timeout, version)
+            finally:
+                locks.unlock(lock)
+
+
+class TieredCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.shared_alias = options.get('SHARED', location)
+        self.l1_max_entries = int(options.get('L1_MAX_ENTRIES', 1000))
+        self.l1_timeout = float(options.get('L1_TIMEOUT', 5))
+        self.jitter = float(options.get('TIMEOUT_JITTER', 0.1))
+        self.location = location
+        self._l1 = _tiers.setdefault(location, OrderedDict())
+        self._lock = _locks.setdefault(location, threading.Lock())
+        self.stats = _stats.setdefault(
+            location, Counter(dict.fromkeys(STATS, 0))
+        )
+
+    @property
+    def shared(self):
+        return caches[self.shared_alias]
+
+    def _jittered(self, timeout):
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        if not timeout or not self.jitter:
+            return timeout
+        return max(1, int(timeout * random.uniform(1 - self.jitter, 1)))
+
+    def _count(self, stat):
+        with self._lock:
+            self.stats[stat] += 1
+
+    def _l1_get(self, key):
+        with self._lock:
+            entry = self._l1.get(key)
+            if entry is None:
+                return MISSING
+            pickled, expires = entry
+            if expires <= time.monotonic():
+                del self._l1[key]
+                return MISSING
+            self._l1.move_to_end(key)
+        return pickle.loads(pickled)
+
+    def _l1_set(self, key, value, timeout=None):
+        ttl = self.l1_timeout
+        if timeout is not None:
+            ttl = min(ttl, timeout)
+        if ttl <= 0:
+            self._l1_delete(key)
+            return
+        # Значение хранится сериализованным, как в LocMemCache, чтобы
+        # изменения полученного объекта не попадали в кэш.
+        pickled = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._l1[key] = (pickled, time.monotonic() + ttl)
+            self._l1.move_to_end(key)
+            while len(self._l1) > self.l1_max_entries:
+                self._l1.popitem(last=False)
+
+    def _l1_delete(self, key):
+        with self._lock:
+            self._l1.pop(key, None)
+
+    def get(self, key, default=None, version=None):
+        l1_key = self.make_key(key, version)
+        value = self._l1_get(l1_key)
+        if value is not MISSING:
+            self._count('l1_hits')
+            return value
+        value = self.shared.get(key, MISSING, version=version)
+        if value is MISSING:
+            self._count('misses')
+            return default
+        self._count('shared_hits')
+        self._l1_set(l1_key, value)
+        return value
+
+    def get_many(self, keys, version=None):
+        """Ключи, которых нет в локальном уровне, читаются из общего
+        кэша одним запросом."""
+        keys = list(keys)
+        found = {}
+        remote = []
+        for key in keys:
+            value = self._l1_get(self.make_key(key, version))
+            if value is MISSING:
+                remote.append(key)
+            else:
+                found[key] = value
+        shared = self.shared.get_many(remote, version=version)
+        for key, value in shared.items():
+            self._l1_set(self.make_key(key, version), value)
+        found.update(shared)
+        with self._lock:
+            self.stats['l1_hits'] += len(keys) - len(remote)
+            self.stats['shared_hits'] += len(shared)
+            self.stats['misses'] += len(remote) - len(shared)
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        timeout = self._jittered(timeout)
+        self.shared.set(key, value, timeout, version=version)
+        self._l1_set(self.make_key(key, version), value, timeout)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        timeout = self._jittered(timeout)
+        failed = self.shared.set_many(data, timeout, version=version)
+        for key, value in data.items():
+            self._l1_set(self.make_key(key, version), value, timeout)
+        return failed
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        # add служит блокировкой, поэтому решает только общий кэш.
+        self._l1_delete(self.make_key(key, version))
+        return self.shared.add(
+            key, value, self._jittered(timeout), version=version
+        )
+
+    def incr(self, key, delta=1, version=None):
+        value = self.shared.incr(key, delta, version=version)
+        self._l1_set(self.make_key(key, version), value)
+        return value
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        self._l1_delete(self.make_key(key, version))
+        return self.shared.touch(key, self._jittered(timeout), version)
+
+    def delete(self, key, version=None):
+        self._l1_delete(self.make_key(key, version))
+        self.shared.delete(key, version=version)
+
+    def clear(self):
+        with self._lock:
+            self._l1.clear()
+        self.shared.clear()
+
+
+def cache_stats():
+    """Счётчики чтений двухуровневых кэшей: {LOCATION: {счётчик: число}}."""
+    return {
+        location: dict(stats)
+        for location, stats in list(_stats.items())
+    }
+
+
+def stats_to_prometheus():
+    name = PREFIX + 'requests_total'
+    lines = [
+        f'# HELP {name} Чтения из кэша по результату',
+        f'# TYPE {name} counter',
+    ]
+    for location, stats in sorted(cache_stats().items()):
+        for stat in STATS:
+            label = f'cache="{location}",result="{stat}"'
+            lines.append(f'{name}{{{label}}} {stats.get(stat, 0)}')
+    return '\n'.join(lines) + '\n'
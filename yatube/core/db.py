@@ -0,0 +1,28 @@
+"""Настройка соединений с базой данных.
+
+Новым соединениям SQLite задаются PRAGMA из SQLITE_PRAGMAS, а при
+DB_CONN_HEALTH_CHECKS переиспользуемые соединения проверяются в начале
+каждого запроса (в Django 2.2 нет встроенного CONN_HEALTH_CHECKS).
+"""
+from django.conf import settings
+from django.db import connections
+
+
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in settings.SQLITE_PRAGMAS.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+def close_unusable_connections(**kwargs):
+    if not settings.DB_CONN_HEALTH_CHECKS:
+        return
+    for connection in connections.all():
+        if (
+            connection.connection is not None
+            and not connection.in_atomic_block
+            and not connection.is_usable()
+        ):
+            connection.close()
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from core.media import collect_garbage
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает ссылки на файлы с именами по содержимому '
+        'и удаляет файлы, на которые никто не ссылается.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только перечислить файлы, которые будут удалены.',
+        )
+
+    def handle(self, *args, **options):
+        removed = collect_garbage(dry_run=options['dry_run'])
+        for name in removed:
+            self.stdout.write(name)
+        verb = 'Будут удалены' if options['dry_run'] else 'Удалены'
+        self.stdout.write(
+            self.style.SUCCESS(f'{verb} файлы без ссылок: {len(removed)}')
+        )
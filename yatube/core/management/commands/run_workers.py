@@ -0,0 +1,88 @@
+import multiprocessing
+import signal
+import threading
+
+import django
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+
+def run_process(threads, batch_size, once):
+    """Процесс воркеров; SIGTERM и Ctrl+C дают дописать текущие задачи."""
+    if not apps.ready:
+        # Процесс запущен методом spawn и начинает с чистого интерпретатора.
+        django.setup()
+    from core.tasks import run_workers
+
+    stop = threading.Event()
+    if not once:
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, lambda *args: stop.set())
+    run_workers(threads, stop, batch_size, once)
+
+
+class Command(BaseCommand):
+    help = 'Выполняет фоновые задачи из очереди.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes',
+            type=int,
+            default=settings.TASKS_WORKER_PROCESSES,
+            help='Число процессов воркеров.',
+        )
+        parser.add_argument(
+            '--threads',
+            type=int,
+            default=settings.TASKS_WORKER_THREADS,
+            help='Число потоков в каждом процессе.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=settings.TASKS_BATCH_SIZE,
+            help='Сколько задач воркер забирает за раз.',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Выполнить готовые задачи и выйти.',
+        )
+
+    def handle(self, *args, **options):
+        processes = max(options['processes'], 1)
+        worker_args = (
+            max(options['threads'], 1), options['batch_size'], options['once']
+        )
+        if not options['once']:
+            self.stdout.write(
+                f'Воркеры: процессов {processes}, '
+                f'потоков в процессе {worker_args[0]}'
+            )
+        if processes == 1:
+            run_process(*worker_args)
+            return
+        # Открытые соединения нельзя делить с дочерними процессами.
+        connections.close_all()
+        children = [
+            multiprocessing.Process(
+                target=run_process,
+                args=worker_args,
+                name=f'tasks-{number}',
+            )
+            for number in range(processes)
+        ]
+        for child in children:
+            child.start()
+
+        def stop_children(signum, frame):
+            for child in children:
+                child.terminate()
+
+        signal.signal(signal.SIGTERM, stop_children)
+        # Ctrl+C получают все процессы группы, здесь остаётся дождаться их.
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        for child in children:
+            child.join()
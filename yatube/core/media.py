@@ -0,0 +1,146 @@
+"""Учёт ссылок на файлы в ContentAddressedStorage и сборка мусора.
+
+Одинаковые загрузки делят один файл, поэтому файл удаляется, только когда
+на него не ссылается ни одна запись. Сигналы моделей вызывают
+add_reference и release; когда ссылок не остаётся, удаление ставится
+в очередь фоновых задач через MEDIA_GC_GRACE секунд и перед удалением
+ссылки ещё раз проверяются по базе. Команда gc_media пересчитывает ссылки
+по базе и удаляет файлы, на которые никто не ссылается, например
+оставшиеся после загрузки данных в обход моделей.
+"""
+import posixpath
+from collections import Counter
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.db.models import F, FileField
+from django.utils import timezone
+
+from .models import StoredFile
+from .storage import ContentAddressedStorage
+from .tasks import task
+
+BATCH_SIZE = 500
+
+
+def content_addressed_fields():
+    """Пары (модель, поле) файловых полей с ContentAddressedStorage."""
+    for model in apps.get_models():
+        for field in model._meta.concrete_fields:
+            if isinstance(field, FileField) and isinstance(
+                field.storage, ContentAddressedStorage
+            ):
+                yield model, field
+
+
+def _field_file(field, name):
+    return field.attr_class(None, field, name)
+
+
+def is_referenced(name):
+    return any(
+        model._default_manager.filter(**{field.name: name}).exists()
+        for model, field in content_addressed_fields()
+    )
+
+
+def add_reference(name, count=1):
+    if not name:
+        return
+    StoredFile.objects.bulk_create(
+        [StoredFile(name=name)], ignore_conflicts=True
+    )
+    StoredFile.objects.filter(name=name).update(refs=F('refs') + count)
+
+
+def release(name):
+    """Снимает ссылку и, если ссылок не осталось, планирует удаление."""
+    if not name:
+        return
+    StoredFile.objects.filter(name=name).update(refs=F('refs') - 1)
+    if not StoredFile.objects.filter(name=name, refs__gt=0).exists():
+        delete_unreferenced.enqueue(
+            name, key=name, delay=settings.MEDIA_GC_GRACE
+        )
+
+
+def _delete(field, name):
+    # Вместе с картинкой удаляются её миниатюры sorl-thumbnail.
+    from sorl.thumbnail import delete
+    delete(_field_file(field, name))
+
+
+@task
+def delete_unreferenced(name):
+    """Удаляет файл, если на него так и не появилось ссылок."""
+    if StoredFile.objects.filter(name=name, refs__gt=0).exists():
+        return
+    if is_referenced(name):
+        return
+    for _, field in content_addressed_fields():
+        if field.storage.exists(name):
+            _delete(field, name)
+            break
+    StoredFile.objects.filter(name=name, refs__lte=0).delete()
+
+
+def _walk(storage, directory):
+    directories, files = storage.listdir(directory)
+    for file_name in files:
+        yield posixpath.join(directory, file_name)
+    for subdirectory in directories:
+        yield from _walk(storage, posixpath.join(directory, subdirectory))
+
+
+def rebuild_references():
+    """Пересчитывает StoredFile по базе; возвращает ссылки по именам."""
+    counts = Counter()
+    for model, field in content_addressed_fields():
+        counts.update(
+            model._default_manager.exclude(**{field.name: ''}).exclude(
+                **{f'{field.name}__isnull': True}
+            ).values_list(field.name, flat=True).iterator()
+        )
+    stale = []
+    for stored in StoredFile.objects.iterator():
+        refs = counts.get(stored.name, 0)
+        if stored.refs != refs:
+            stored.refs = refs
+            stale.append(stored)
+    StoredFile.objects.bulk_update(stale, ['refs'], batch_size=BATCH_SIZE)
+    StoredFile.objects.bulk_create(
+        [StoredFile(name=name, refs=refs) for name, refs in counts.items()],
+        ignore_conflicts=True,
+        batch_size=BATCH_SIZE,
+    )
+    return counts
+
+
+def collect_garbage(dry_run=False):
+    """Удаляет файлы каталогов upload_to, на которые нет ссылок и которые
+    старше MEDIA_GC_GRACE секунд; возвращает их имена."""
+    counts = rebuild_references()
+    deadline = timezone.now() - timedelta(seconds=settings.MEDIA_GC_GRACE)
+    removed = []
+    seen = set()
+    for _, field in content_addressed_fields():
+        directory = field.upload_to
+        if callable(directory) or (field.storage, directory) in seen:
+            continue
+        seen.add((field.storage, directory))
+        if not field.storage.exists(directory):
+            continue
+        for name in _walk(field.storage, directory.rstrip('/')):
+            if name in counts:
+                continue
+            if field.storage.get_modified_time(name) > deadline:
+                continue
+            if not dry_run:
+                _delete(field, name)
+            removed.append(name)
+    if not dry_run:
+        for start in range(0, len(removed), BATCH_SIZE):
+            chunk = removed[start:start + BATCH_SIZE]
+            StoredFile.objects.filter(refs__lte=0, name__in=chunk).delete()
+    return removed
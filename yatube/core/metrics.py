@@ -0,0 +1,129 @@
+"""Метрики запросов, собираемые в памяти процесса.
+
+Для каждого view копятся гистограммы числа SQL-запросов, времени работы
+с БД, времени рендеринга шаблонов, общего времени ответа и размера ответа.
+Гистограммы отдаются в текстовом формате Prometheus или в JSON.
+"""
+import json
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from itertools import accumulate
+
+SECONDS_BUCKETS = (
+    0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5,
+)
+METRICS = {
+    'db_queries': (
+        'Число SQL-запросов за запрос',
+        (1, 2, 5, 10, 20, 50, 100, 200),
+    ),
+    'db_seconds': ('Время выполнения SQL-запросов', SECONDS_BUCKETS),
+    'template_seconds': ('Время рендеринга шаблонов', SECONDS_BUCKETS),
+    'request_seconds': ('Общее время ответа', SECONDS_BUCKETS),
+    'response_bytes': (
+        'Размер ответа в байтах',
+        (1_000, 5_000, 10_000, 50_000, 100_000, 500_000, 1_000_000),
+    ),
+}
+PREFIX = 'yatube_view_'
+
+current_sample = ContextVar('current_sample', default=None)
+
+
+class RequestSample:
+    """Замеры одного запроса. Вызывается как execute_wrapper БД."""
+
+    def __init__(self):
+        self.db_queries = 0
+        self.db_seconds = 0.0
+        self.template_seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_queries += 1
+            self.db_seconds += time.perf_counter() - started
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        """Пары (верхняя граница, число наблюдений не больше неё)."""
+        bounds = [str(bound) for bound in self.buckets] + ['+Inf']
+        return list(zip(bounds, accumulate(self.counts)))
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+
+    def observe(self, metric, view, value):
+        with self._lock:
+            histogram = self._histograms.get((metric, view))
+            if histogram is None:
+                histogram = Histogram(METRICS[metric][1])
+                self._histograms[metric, view] = histogram
+            histogram.observe(value)
+
+    def clear(self):
+        with self._lock:
+            self._histograms.clear()
+
+    def _snapshot(self):
+        with self._lock:
+            return sorted(
+                (
+                    metric,
+                    view,
+                    histogram.cumulative(),
+                    histogram.sum,
+                    histogram.count,
+                )
+                for (metric, view), histogram in self._histograms.items()
+            )
+
+    def to_prometheus(self):
+        lines = []
+        described = set()
+        for metric, view, buckets, total, count in self._snapshot():
+            name = PREFIX + metric
+            if metric not in described:
+                described.add(metric)
+                lines.append(f'# HELP {name} {METRICS[metric][0]}')
+                lines.append(f'# TYPE {name} histogram')
+            label = f'view="{view}"'
+            for bound, observed in buckets:
+                lines.append(
+                    f'{name}_bucket{{{label},le="{bound}"}} {observed}'
+                )
+            lines.append(f'{name}_sum{{{label}}} {total}')
+            lines.append(f'{name}_count{{{label}}} {count}')
+        return '\n'.join(lines) + '\n'
+
+    def to_json(self):
+        data = {}
+        for metric, view, buckets, total, count in self._snapshot():
+            data.setdefault(view, {})[metric] = {
+                'count': count,
+                'sum': total,
+                'buckets': dict(buckets),
+            }
+        return json.dumps(data, ensure_ascii=False)
+
+
+registry = MetricsRegistry()
@@ -0,0 +1,114 @@
+import random
+import re
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+from .metrics import RequestSample, current_sample, registry
+from .replicas import RoutingState, choose_replica, current_routing
+
+
+class MetricsMiddleware:
+    """Собирает метрики для доли METRICS_SAMPLE_RATE запросов.
+
+    Запросы вне выборки проходят без обёрток, поэтому накладные расходы
+    пропорциональны доле выборки.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if random.random() >= settings.METRICS_SAMPLE_RATE:
+            return self.get_response(request)
+        sample = RequestSample()
+        token = current_sample.set(sample)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(sample))
+                response = self.get_response(request)
+        finally:
+            current_sample.reset(token)
+        elapsed = time.perf_counter() - started
+        match = request.resolver_match
+        view = match.view_name if match else 'unresolved'
+        registry.observe('db_queries', view, sample.db_queries)
+        registry.observe('db_seconds', view, sample.db_seconds)
+        registry.observe('template_seconds', view, sample.template_seconds)
+        registry.observe('request_seconds', view, elapsed)
+        if not response.streaming:
+            registry.observe('response_bytes', view, len(response.content))
+        return response
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """Сжимает ответ brotli, если его принимает клиент, иначе - gzip,
+    как GZipMiddleware. Пакет Brotli указан в requirements.txt; если он
+    не установлен, все ответы сжимаются gzip.
+    """
+
+    accepts_brotli = re.compile(r'\bbr\b')
+
+    def process_response(self, request, response):
+        if (
+            brotli is None
+            or response.streaming
+            or len(response.content) < 200
+            or response.has_header('Content-Encoding')
+            or not self.accepts_brotli.search(
+                request.META.get('HTTP_ACCEPT_ENCODING', '')
+            )
+        ):
+            return super().process_response(request, response)
+        patch_vary_headers(response, ('Accept-Encoding',))
+        compressed = brotli.compress(response.content)
+        if len(compressed) >= len(response.content):
+            return response
+        response.content = compressed
+        response['Content-Length'] = str(len(compressed))
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = 'br'
+        return response
+
+
+class ReplicaMiddleware:
+    """Направляет чтение view с @use_replica в реплику и закрепляет
+    клиента за основной базой после его записи."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        state = RoutingState()
+        token = current_routing.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_routing.reset(token)
+        if state.wrote:
+            response.set_cookie(
+                settings.DB_REPLICA_STICKY_COOKIE,
+                '1',
+                max_age=settings.DB_REPLICA_STICKY_SECONDS,
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        sticky = settings.DB_REPLICA_STICKY_COOKIE in request.COOKIES
+        if getattr(view_func, 'use_replica', False) and not sticky:
+            current_routing.get().replica = choose_replica()
@@ -0,0 +1,84 @@
+from django.db import models
+from django.utils import timezone
+
+
+class Task(models.Model):
+    """Фоновая задача в очереди core.tasks."""
+
+    PENDING = 'pending'
+    RUNNING = 'running'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (PENDING, 'Ждёт'),
+        (RUNNING, 'Выполняется'),
+        (FAILED, 'Ошибка'),
+    )
+
+    name = models.CharField(max_length=200, verbose_name='Задача')
+    args = models.TextField(default='[]', verbose_name='Аргументы (JSON)')
+    key = models.CharField(
+        max_length=255,
+        null=True,
+        blank=True,
+        verbose_name='Ключ идемпотентности',
+    )
+    status = models.CharField(
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default=PENDING,
+        verbose_name='Состояние',
+    )
+    attempts = models.PositiveIntegerField(
+        default=0, verbose_name='Попыток'
+    )
+    max_attempts = models.PositiveIntegerField(verbose_name='Попыток всего')
+    run_at = models.DateTimeField(
+        default=timezone.now, verbose_name='Выполнить после'
+    )
+    created = models.DateTimeField(
+        auto_now_add=True, verbose_name='Поставлена'
+    )
+    locked_by = models.CharField(
+        max_length=255, blank=True, verbose_name='Воркер'
+    )
+    locked_at = models.DateTimeField(
+        null=True, blank=True, verbose_name='Взята'
+    )
+    error = models.TextField(blank=True, verbose_name='Последняя ошибка')
+
+    class Meta:
+        ordering = ('run_at', 'id')
+        verbose_name = 'Фоновая задача'
+        verbose_name_plural = 'Фоновые задачи'
+        # Воркеры выбирают готовые задачи по индексу (status, run_at).
+        indexes = [
+            models.Index(
+                name='task_status_run_at_idx',
+                fields=['status', 'run_at'],
+            ),
+        ]
+        # В очереди не больше одной ждущей задачи с данным ключом.
+        constraints = [
+            models.UniqueConstraint(
+                name='unique_pending_task_key',
+                fields=['key'],
+                condition=models.Q(status='pending'),
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.name} #{self.pk}'
+
+
+class StoredFile(models.Model):
+    """Число ссылок из моделей на файл в ContentAddressedStorage."""
+
+    name = models.CharField(max_length=255, unique=True, verbose_name='Файл')
+    refs = models.IntegerField(default=0, verbose_name='Ссылок')
+
+    class Meta:
+        verbose_name = 'Файл в хранилище'
+        verbose_name_plural = 'Файлы в хранилище'
+
+    def __str__(self):
+        return f'{self.name} ({self.refs})'
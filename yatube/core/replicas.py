@@ -0,0 +1,70 @@
+"""Чтение из реплик базы данных для view, которые только читают.
+
+View, помеченные @use_replica, читают модели приложений из реплики,
+выбранной на весь запрос. Остальные view, записи, а также таблицы входа
+и сессий работают с основной базой. После того как запрос клиента
+что-то записал, ReplicaMiddleware ставит cookie, и следующие
+DB_REPLICA_STICKY_SECONDS секунд клиент читает из основной базы, чтобы
+видеть свои изменения, пока реплики их догоняют.
+"""
+import random
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+
+PRIMARY = 'default'
+# Приложения, которые всегда читаются из основной базы.
+PRIMARY_APPS = {'auth', 'sessions', 'contenttypes', 'admin'}
+
+
+class RoutingState:
+    """Маршрутизация одного запроса."""
+
+    def __init__(self):
+        self.replica = None
+        self.wrote = False
+
+
+current_routing = ContextVar('current_routing', default=None)
+
+
+def use_replica(view):
+    """Помечает view, которому достаточно данных из реплики."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        return view(*args, **kwargs)
+    wrapper.use_replica = True
+    return wrapper
+
+
+def choose_replica():
+    if not settings.DATABASE_REPLICAS:
+        return None
+    return random.choice(settings.DATABASE_REPLICAS)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = current_routing.get()
+        if (
+            state is None
+            or state.replica is None
+            or state.wrote
+            or model._meta.app_label in PRIMARY_APPS
+        ):
+            return PRIMARY
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        state = current_routing.get()
+        if state is not None:
+            state.wrote = True
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики - копии основной базы, связи между ними допустимы.
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db == PRIMARY
@@ -0,0 +1,56 @@
+"""Хранилище файлов с именами по содержимому.
+
+Файл сохраняется как <каталог>/<xx>/<хеш>.<расширение>, где хеш -
+первые 32 символа SHA-256 содержимого, а xx - его начало. Одинаковые
+загрузки получают одно имя, и второй раз файл не записывается, даже если
+они пришли одновременно. Файл с таким именем никогда не меняется,
+поэтому его можно отдавать с Cache-Control: immutable.
+"""
+import hashlib
+import os
+import posixpath
+import re
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+HASH_LENGTH = 32
+HASHED_NAME_RE = re.compile(
+    r'(?:^|/)([0-9a-f]{2})/\1[0-9a-f]{%d}(?:\.\w+)?$' % (HASH_LENGTH - 2)
+)
+
+
+def is_content_addressed(name):
+    return bool(HASHED_NAME_RE.search(name))
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    def content_name(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        digest = digest.hexdigest()[:HASH_LENGTH]
+        directory = posixpath.dirname(name.replace('\\', '/'))
+        extension = os.path.splitext(name)[1].lower()
+        return posixpath.join(directory, digest[:2], digest + extension)
+
+    def get_available_name(self, name, max_length=None):
+        # Файл с именем по содержимому - та же самая картинка, и новое
+        # имя с суффиксом ему не нужно. Сюда приходит и одновременная
+        # загрузка, проигравшая гонку за создание файла.
+        if self.exists(name):
+            raise FileExistsError(name)
+        return name
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.content_name(name, content)
+        try:
+            return super().save(name, content, max_length)
+        except FileExistsError:
+            return name
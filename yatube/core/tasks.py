@@ -0,0 +1,233 @@
+"""Очередь фоновых задач в таблице core.Task.
+
+Функция, помеченная @task, ставится в очередь вызовом
+func.enqueue(*args, key=None, delay=0): в текущей транзакции добавляется
+строка Task, так что задача появляется в очереди только вместе
+с записью, которая её породила, а запрос не ждёт выполнения. Аргументы
+должны сериализоваться в JSON.
+
+Воркеры (команда run_workers) забирают готовые задачи, выполняют их
+и удаляют выполненные. Упавшая задача откладывается на TASKS_RETRY_DELAY
+секунд, удваивая задержку с каждой попыткой (не больше
+TASKS_RETRY_MAX_DELAY), а после max_attempts попыток остаётся в таблице
+с ошибкой. Задачи воркеров, не закончивших их за TASKS_LOCK_TIMEOUT
+секунд, считаются упавшими. Задача может прерваться на середине
+и выполниться снова, поэтому задачи должны быть идемпотентны.
+
+Пока в очереди ждёт задача с тем же ключом идемпотентности, новая
+не добавляется: задачи читают данные из базы при выполнении, и одной
+ждущей задачи достаточно. При TASKS_EAGER задачи выполняются сразу
+после коммита в том же процессе, без очереди.
+"""
+import json
+import logging
+import os
+import random
+import socket
+import threading
+import traceback
+import uuid
+from datetime import timedelta
+from functools import partial
+
+from django.conf import settings
+from django.db import (DatabaseError, IntegrityError, close_old_connections,
+                       connections, transaction)
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Task
+
+logger = logging.getLogger(__name__)
+
+_registry = {}
+
+
+def task(func=None, *, max_attempts=None):
+    """Регистрирует функцию как фоновую задачу и добавляет ей enqueue."""
+    if func is None:
+        return partial(task, max_attempts=max_attempts)
+    name = f'{func.__module__}.{func.__qualname__}'
+    _registry[name] = func
+    func.task_name = name
+    func.enqueue = partial(enqueue, name, max_attempts=max_attempts)
+    return func
+
+
+def get_task(name):
+    if name not in _registry:
+        # Задачи регистрируются при импорте своего модуля.
+        import_string(name)
+    try:
+        return _registry[name]
+    except KeyError:
+        raise LookupError(f'{name} не помечена как фоновая задача')
+
+
+def enqueue(name, *args, key=None, delay=0, max_attempts=None):
+    """Ставит задачу name(*args) в очередь.
+
+    key - ключ идемпотентности в пределах задачи, delay - через сколько
+    секунд задачу можно выполнять.
+    """
+    encoded = json.dumps(args)
+    if settings.TASKS_EAGER:
+        transaction.on_commit(
+            lambda: get_task(name)(*json.loads(encoded))
+        )
+        return
+    Task.objects.bulk_create(
+        [
+            Task(
+                name=name,
+                args=encoded,
+                key=None if key is None else f'{name}:{key}',
+                max_attempts=max_attempts or settings.TASKS_MAX_ATTEMPTS,
+                run_at=timezone.now() + timedelta(seconds=delay),
+            )
+        ],
+        ignore_conflicts=True,
+    )
+
+
+def retry_delay(attempts):
+    """Случайная задержка перед следующей попыткой, чтобы задачи,
+    упавшие разом, не повторялись одновременно."""
+    delay = min(
+        settings.TASKS_RETRY_MAX_DELAY,
+        settings.TASKS_RETRY_DELAY * 2 ** (attempts - 1),
+    )
+    return random.uniform(delay / 2, delay)
+
+
+def worker_name():
+    return (
+        f'{socket.gethostname()}:{os.getpid()}:'
+        f'{threading.current_thread().name}'
+    )
+
+
+def claim(worker, limit):
+    """Забирает до limit готовых задач.
+
+    Задачу забирает тот воркер, чей UPDATE сменил её состояние,
+    поэтому блокировки строк не нужны и SQLite тоже подходит.
+    """
+    now = timezone.now()
+    ids = list(
+        Task.objects.filter(
+            status=Task.PENDING, run_at__lte=now
+        ).values_list('pk', flat=True)[:limit]
+    )
+    if not ids:
+        return []
+    token = f'{worker}:{uuid.uuid4().hex}'[-255:]
+    Task.objects.filter(pk__in=ids, status=Task.PENDING).update(
+        status=Task.RUNNING,
+        locked_by=token,
+        locked_at=now,
+        attempts=F('attempts') + 1,
+    )
+    return list(Task.objects.filter(status=Task.RUNNING, locked_by=token))
+
+
+def fail(task, error):
+    """Откладывает упавшую задачу или, если попытки кончились,
+    оставляет её с ошибкой."""
+    running = Task.objects.filter(
+        pk=task.pk, status=Task.RUNNING, locked_by=task.locked_by
+    )
+    if task.attempts >= task.max_attempts:
+        logger.error('Задача %s не выполнена: %s', task, error)
+        running.update(status=Task.FAILED, error=error, locked_at=None)
+        return
+    run_at = timezone.now() + timedelta(seconds=retry_delay(task.attempts))
+    try:
+        with transaction.atomic():
+            running.update(
+                status=Task.PENDING,
+                run_at=run_at,
+                error=error,
+                locked_by='',
+                locked_at=None,
+            )
+    except IntegrityError:
+        # Пока задача выполнялась, в очередь встала такая же.
+        running.delete()
+
+
+def execute(task):
+    try:
+        get_task(task.name)(*json.loads(task.args))
+    except Exception:
+        logger.exception('Ошибка в задаче %s', task)
+        fail(task, traceback.format_exc())
+    else:
+        Task.objects.filter(pk=task.pk).delete()
+
+
+def release_stale():
+    """Возвращает в очередь задачи воркеров, которые не закончили
+    их за TASKS_LOCK_TIMEOUT секунд."""
+    deadline = timezone.now() - timedelta(seconds=settings.TASKS_LOCK_TIMEOUT)
+    stale = Task.objects.filter(status=Task.RUNNING, locked_at__lt=deadline)
+    for task in stale:
+        fail(task, f'Воркер {task.locked_by} не закончил задачу вовремя')
+
+
+def run_pending(batch_size=None):
+    """Выполняет готовые задачи, пока они есть; возвращает их число."""
+    worker = worker_name()
+    done = 0
+    while True:
+        tasks = claim(worker, batch_size or settings.TASKS_BATCH_SIZE)
+        if not tasks:
+            return done
+        for task in tasks:
+            execute(task)
+        done += len(tasks)
+
+
+def work(stop, batch_size=None, once=False):
+    """Цикл воркера: выполняет задачи, пока не выставлен stop.
+    При once выходит, когда готовых задач не осталось."""
+    while not stop.is_set():
+        try:
+            close_old_connections()
+            release_stale()
+            done = run_pending(batch_size)
+        except DatabaseError:
+            logger.exception('Ошибка базы данных в воркере')
+            done = 0
+        if once and not done:
+            return
+        if not done:
+            stop.wait(settings.TASKS_POLL_INTERVAL)
+
+
+def _work_in_thread(*args, **kwargs):
+    try:
+        work(*args, **kwargs)
+    finally:
+        connections.close_all()
+
+
+def run_workers(threads, stop, batch_size=None, once=False):
+    """Запускает threads воркеров; один работает в текущем потоке."""
+    if threads <= 1:
+        work(stop, batch_size, once)
+        return
+    pool = [
+        threading.Thread(
+            target=_work_in_thread,
+            args=(stop, batch_size, once),
+            name=f'tasks-{number}',
+            daemon=True,
+        )
+        for number in range(threads)
+    ]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
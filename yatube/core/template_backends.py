@@ -0,0 +1,46 @@
+import threading
+import time
+
+from django.template import TemplateDoesNotExist
+from django.template.backends.django import DjangoTemplates, Template, reraise
+
+from .metrics import current_sample
+
+# Глубина вложенных рендерингов в потоке: время шаблона, отрендеренного
+# внутри другого (render_to_string в теге), уже входит во время внешнего.
+_state = threading.local()
+
+
+class InstrumentedTemplate(Template):
+    def render(self, context=None, request=None):
+        sample = current_sample.get()
+        if sample is None:
+            return super().render(context, request)
+        depth = getattr(_state, 'depth', 0)
+        _state.depth = depth + 1
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            _state.depth = depth
+            if not depth:
+                sample.template_seconds += time.perf_counter() - started
+
+
+class InstrumentedDjangoTemplates(DjangoTemplates):
+    """Бэкенд Django-шаблонов, учитывающий время рендеринга в метриках
+    запроса (см. core.middleware.MetricsMiddleware).
+    """
+
+    def from_string(self, template_code):
+        return InstrumentedTemplate(
+            self.engine.from_string(template_code), self
+        )
+
+    def get_template(self, template_name):
+        try:
+            return InstrumentedTemplate(
+                self.engine.get_template(template_name), self
+            )
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
@@ -0,0 +1,131 @@
+import shutil
+import tempfile
+import threading
+import time
+from unittest import mock
+
+from django.core.cache import caches
+from django.core.cache.backends import filebased
+from django.test import SimpleTestCase, override_settings
+
+from ..cache import FileBasedCache, TieredCache, cache_stats
+
+TEST_CACHES = {
+    'tiered': {
+        'BACKEND': 'core.cache.TieredCache',
+        'LOCATION': 'tiered-test',
+        'TIMEOUT': 100,
+        'OPTIONS': {
+            'SHARED': 'tiered-shared',
+            'L1_MAX_ENTRIES': 2,
+            'L1_TIMEOUT': 5,
+            'TIMEOUT_JITTER': 0.2,
+        },
+    },
+    'tiered-shared': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'tiered-shared-test',
+    },
+}
+
+
+@override_settings(CACHES=TEST_CACHES)
+class TieredCacheTest(SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        self.cache = caches['tiered']
+        self.shared = caches['tiered-shared']
+        self.cache.clear()
+        self.cache.stats.clear()
+
+    def other_process(self):
+        """Экземпляр с собственным локальным уровнем, как в другом
+        процессе."""
+        return TieredCache('tiered-other', TEST_CACHES['tiered'])
+
+    def test_reads_are_served_from_local_tier(self):
+        self.cache.set('key', 'value')
+        self.shared.delete('key')
+        self.assertEqual(self.cache.get('key'), 'value')
+        self.assertEqual(cache_stats()['tiered-test']['l1_hits'], 1)
+
+    def test_local_tier_is_filled_from_shared(self):
+        self.cache.set('key', 'value')
+        other = self.other_process()
+        other.clear()
+        self.shared.set('key', 'value')
+        self.assertEqual(other.get('key'), 'value')
+        self.assertEqual(other.get('missing'), None)
+        stats = cache_stats()['tiered-other']
+        self.assertEqual(stats['shared_hits'], 1)
+        self.assertEqual(stats['misses'], 1)
+
+    def test_local_copies_expire(self):
+        self.cache.set('key', 'old')
+        self.shared.set('key', 'new')
+        with mock.patch('core.cache.time.monotonic', return_value=1e12):
+            self.assertEqual(self.cache.get('key'), 'new')
+
+    def test_local_tier_is_bounded(self):
+        for key in ('a', 'b', 'c'):
+            self.cache.set(key, key)
+        self.assertEqual(len(self.cache._l1), 2)
+        self.shared.delete('a')
+        self.assertIsNone(self.cache.get('a'))
+
+    def test_writes_reach_shared_tier(self):
+        """incr, add и delete видны другим процессам сразу."""
+        other = self.other_process()
+        self.cache.set('counter', 1)
+        self.assertEqual(other.get('counter'), 1)
+        self.assertEqual(self.cache.incr('counter'), 2)
+        self.assertEqual(self.cache.get('counter'), 2)
+        self.assertEqual(self.shared.get('counter'), 2)
+        self.assertTrue(self.cache.add('lock', True))
+        self.assertFalse(other.add('lock', True))
+        self.cache.delete('lock')
+        self.assertTrue(other.add('lock', True))
+
+    def test_timeouts_are_jittered_down(self):
+        with mock.patch.object(self.shared, 'set') as shared_set:
+            for _ in range(20):
+                self.cache.set('key', 'value')
+        timeouts = {call.args[2] for call in shared_set.call_args_list}
+        self.assertTrue(all(80 <= timeout <= 100 for timeout in timeouts))
+        self.assertGreater(len(timeouts), 1)
+        with mock.patch.object(self.shared, 'set') as shared_set:
+            self.cache.set('key', 'value', timeout=None)
+        self.assertIsNone(shared_set.call_args.args[2])
+
+
+class FileBasedCacheTest(SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def test_add_is_atomic(self):
+        """Из одновременных add одного ключа удаётся ровно один."""
+        has_key = filebased.FileBasedCache.has_key
+
+        def slow_has_key(cache, *args, **kwargs):
+            found = has_key(cache, *args, **kwargs)
+            time.sleep(0.05)
+            return found
+
+        results = []
+
+        def add():
+            # Отдельный экземпляр на поток, как в разных процессах.
+            cache = FileBasedCache(self.directory, {})
+            results.append(cache.add('lock', True, 10))
+
+        with mock.patch.object(
+            filebased.FileBasedCache, 'has_key', slow_has_key
+        ):
+            threads = [threading.Thread(target=add) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(sorted(results), [False, False, False, True])
@@ -0,0 +1,46 @@
+import os
+import tempfile
+from unittest import mock
+
+from django.db import connection
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.test import TestCase, override_settings
+
+from ..db import close_unusable_connections
+
+
+class SqlitePragmasTest(TestCase):
+    def pragma(self, db, name):
+        with db.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_new_connections_get_pragmas(self):
+        """Файл базы переводится в WAL, соединения - в настроенный режим."""
+        with tempfile.TemporaryDirectory() as directory:
+            db = DatabaseWrapper({
+                **connection.settings_dict,
+                'NAME': os.path.join(directory, 'db.sqlite3'),
+            })
+            try:
+                self.assertEqual(self.pragma(db, 'journal_mode'), 'wal')
+                self.assertEqual(self.pragma(db, 'synchronous'), 1)
+                self.assertEqual(self.pragma(db, 'busy_timeout'), 5000)
+                self.assertEqual(self.pragma(db, 'cache_size'), -64000)
+            finally:
+                db.close()
+
+
+class HealthCheckTest(TestCase):
+    def test_broken_connection_closed_before_request(self):
+        connection.ensure_connection()
+        patches = (
+            mock.patch.object(connection, 'in_atomic_block', False),
+            mock.patch.object(connection, 'is_usable', return_value=False),
+            mock.patch.object(connection, 'close'),
+        )
+        with patches[0], patches[1], patches[2] as close:
+            close_unusable_connections()
+            with override_settings(DB_CONN_HEALTH_CHECKS=False):
+                close_unusable_connections()
+        close.assert_called_once_with()
@@ -0,0 +1,148 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test import RequestFactory, TestCase, override_settings
+from django.utils import timezone
+
+from posts.models import Post
+
+from ..media import delete_unreferenced
+from ..models import StoredFile, Task
+from ..tasks import run_pending
+from ..views import serve_media
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+User = get_user_model()
+
+
+@override_settings(
+    MEDIA_ROOT=TEMP_MEDIA_ROOT, TASKS_EAGER=False, MEDIA_GC_GRACE=0
+)
+class ContentAddressedMediaTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='author')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def create(self, content=b'same', name='picture.gif'):
+        return Post.objects.create(
+            text='Пост',
+            author=self.author,
+            image=ContentFile(content, name=name),
+        )
+
+    def refs(self, name):
+        return StoredFile.objects.get(name=name).refs
+
+    def exists(self, name):
+        return os.path.exists(os.path.join(TEMP_MEDIA_ROOT, name))
+
+    def run_deletions(self):
+        Task.objects.update(run_at=timezone.now())
+        run_pending()
+
+    def test_identical_uploads_share_one_file(self):
+        first = self.create(name='one.gif')
+        second = self.create(name='two.GIF')
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertRegex(first.image.name, r'^posts/[0-9a-f]{2}/\w{32}\.gif$')
+        self.assertEqual(self.refs(first.image.name), 2)
+        self.assertEqual(
+            len(os.listdir(os.path.dirname(first.image.path))), 1
+        )
+
+    def test_concurrent_identical_upload_keeps_hashed_name(self):
+        """Загрузка, проигравшая гонку за создание файла, получает то же
+        имя по содержимому, а не имя с суффиксом."""
+        name = self.create().image.name
+        storage = Post._meta.get_field('image').storage
+        exists = storage.exists
+        checks = []
+
+        def stale_exists(name):
+            # Первая проверка ещё не видит файл другой загрузки.
+            checks.append(name)
+            return len(checks) > 1 and exists(name)
+
+        with mock.patch.object(storage, 'exists', side_effect=stale_exists):
+            saved = storage.save('posts/again.gif', ContentFile(b'same'))
+        self.assertEqual(saved, name)
+        self.assertEqual(
+            len(os.listdir(os.path.dirname(os.path.join(
+                TEMP_MEDIA_ROOT, name
+            )))), 1
+        )
+
+    def test_file_is_deleted_with_last_reference(self):
+        first = self.create()
+        second = self.create()
+        name = first.image.name
+        first.delete()
+        self.assertFalse(
+            Task.objects.filter(name=delete_unreferenced.task_name).exists()
+        )
+        second.image = ContentFile(b'other', name='other.gif')
+        second.save()
+        self.assertEqual(self.refs(name), 0)
+        self.assertTrue(self.exists(name))
+        self.run_deletions()
+        self.assertFalse(self.exists(name))
+        self.assertFalse(StoredFile.objects.filter(name=name).exists())
+        self.assertTrue(self.exists(second.image.name))
+
+    def test_deletion_checks_database(self):
+        """Ссылку, появившуюся в обход сигналов, удаление не пропускает."""
+        post = self.create()
+        name = post.image.name
+        post.delete()
+        Post.objects.bulk_create(
+            [Post(text='Импорт', author=self.author, image=name)]
+        )
+        self.run_deletions()
+        self.assertTrue(self.exists(name))
+
+    def test_gc_media_sweeps_orphans(self):
+        post = self.create()
+        orphan = post.image.storage.save(
+            'posts/orphan.gif', ContentFile(b'orphan')
+        )
+        Post.objects.filter(pk=post.pk).update(image='')
+        kept = self.create(b'kept').image.name
+        out = StringIO()
+        call_command('gc_media', dry_run=True, stdout=out)
+        self.assertIn(orphan, out.getvalue())
+        self.assertTrue(self.exists(orphan))
+        with override_settings(MEDIA_GC_GRACE=3600):
+            call_command('gc_media', stdout=StringIO())
+        self.assertTrue(self.exists(orphan))
+        call_command('gc_media', stdout=StringIO())
+        self.assertFalse(self.exists(orphan))
+        self.assertFalse(self.exists(post.image.name))
+        self.assertTrue(self.exists(kept))
+        self.assertEqual(self.refs(kept), 1)
+
+    def test_hashed_media_is_immutable(self):
+        name = self.create().image.name
+        legacy = default_storage.save(
+            'posts/legacy.gif', ContentFile(b'legacy')
+        )
+        request = RequestFactory().get('/media/')
+        cache_control = serve_media(request, name, TEMP_MEDIA_ROOT).get(
+            'Cache-Control', ''
+        )
+        self.assertIn('immutable', cache_control)
+        self.assertIn('max-age=31536000', cache_control)
+        response = serve_media(request, legacy, TEMP_MEDIA_ROOT)
+        self.assertFalse(response.has_header('Cache-Control'))
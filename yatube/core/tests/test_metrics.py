@@ -0,0 +1,123 @@
+import json
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.template import engines
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from ..metrics import Histogram, RequestSample, current_sample, registry
+
+User = get_user_model()
+
+
+class HistogramTest(TestCase):
+    def test_cumulative_buckets(self):
+        """Гистограмма копит наблюдения по верхним границам корзин."""
+        histogram = Histogram((1, 5))
+        for value in (0, 1, 3, 10):
+            histogram.observe(value)
+        self.assertEqual(
+            histogram.cumulative(), [('1', 2), ('5', 3), ('+Inf', 4)]
+        )
+        self.assertEqual(histogram.sum, 14)
+        self.assertEqual(histogram.count, 4)
+
+
+class TemplateTimingTest(SimpleTestCase):
+    def test_nested_render_is_counted_once(self):
+        """Шаблон, отрендеренный внутри другого, не добавляет своё время
+        второй раз."""
+        engine = engines.all()[0]
+        clock = [0]
+
+        def work():
+            clock[0] += 1
+            return ''
+
+        inner = engine.from_string('{{ work }}')
+        outer = engine.from_string('{{ card }}')
+        sample = RequestSample()
+        token = current_sample.set(sample)
+        try:
+            with mock.patch(
+                'core.template_backends.time.perf_counter',
+                side_effect=lambda: clock[0],
+            ):
+                outer.render({'card': lambda: inner.render({'work': work})})
+        finally:
+            current_sample.reset(token)
+        self.assertEqual(sample.template_seconds, 1)
+
+
+@override_settings(METRICS_SAMPLE_RATE=1, METRICS_TOKEN='secret')
+class MetricsMiddlewareTest(TestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        registry.clear()
+
+    def get_metrics(self, data=None, token='secret'):
+        return self.client.get(
+            reverse('metrics'), data, HTTP_AUTHORIZATION=f'Bearer {token}'
+        )
+
+    def test_view_metrics_exported_as_json(self):
+        """По каждому view собираются запросы, время и размер ответа."""
+        response = self.client.get(reverse('posts:index'))
+        data = json.loads(
+            self.get_metrics({'format': 'json'}).content
+        )
+        index = data['posts:index']
+        self.assertEqual(index['db_queries']['count'], 1)
+        self.assertGreater(index['db_queries']['sum'], 0)
+        self.assertGreater(index['template_seconds']['sum'], 0)
+        self.assertEqual(
+            index['response_bytes']['sum'], len(response.content)
+        )
+
+    def test_metrics_exported_in_prometheus_format(self):
+        self.client.get(reverse('posts:index'))
+        response = self.get_metrics()
+        self.assertContains(
+            response, '# TYPE yatube_view_db_queries histogram'
+        )
+        self.assertContains(
+            response,
+            'yatube_view_request_seconds_count{view="posts:index"} 1',
+        )
+
+    def test_cache_counters_exported(self):
+        self.client.get(reverse('posts:index'))
+        response = self.get_metrics()
+        self.assertContains(
+            response, '# TYPE yatube_cache_requests_total counter'
+        )
+        self.assertContains(
+            response, 'yatube_cache_requests_total{cache="default",'
+                      'result="misses"}'
+        )
+        data = json.loads(
+            self.get_metrics({'format': 'json'}).content
+        )
+        self.assertIn('l1_hits', data['cache']['default'])
+
+    @override_settings(METRICS_SAMPLE_RATE=0)
+    def test_requests_outside_sample_are_not_recorded(self):
+        self.client.get(reverse('posts:index'))
+        self.assertEqual(registry.to_json(), '{}')
+
+    def test_metrics_hidden_without_token_or_staff(self):
+        """Адрес клиента доступа не даёт: за прокси это 127.0.0.1."""
+        user = User.objects.create(username='user')
+        for token in ('wrong', ''):
+            with self.subTest(token=token):
+                self.assertEqual(
+                    self.get_metrics(token=token).status_code, 404
+                )
+        self.client.force_login(user)
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 404)
+        user.is_staff = True
+        user.save()
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 200)
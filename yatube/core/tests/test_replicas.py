@@ -0,0 +1,55 @@
+from django.contrib.auth import get_user_model
+from django.db import router
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+
+from posts.models import Group, Post
+
+from ..middleware import ReplicaMiddleware
+from ..replicas import use_replica
+
+User = get_user_model()
+
+
+def read_view(request):
+    return HttpResponse(
+        f'{router.db_for_read(Post)} {router.db_for_read(User)}'
+    )
+
+
+def write_view(request):
+    Group.objects.create(title='Группа', slug='group', description='')
+    return read_view(request)
+
+
+@override_settings(DATABASE_REPLICAS=['replica_1'])
+class ReplicaRoutingTest(TestCase):
+    def get(self, view, **cookies):
+        request = RequestFactory().get('/')
+        request.COOKIES.update(cookies)
+        middleware = ReplicaMiddleware(lambda request: None)
+
+        def get_response(request):
+            middleware.process_view(request, view, (), {})
+            return view(request)
+
+        middleware.get_response = get_response
+        return middleware(request)
+
+    def test_marked_views_read_from_replica(self):
+        """Помеченные view читают посты из реплики, пользователей -
+        из основной базы; остальные view - только из основной."""
+        self.assertEqual(
+            self.get(use_replica(read_view)).content, b'replica_1 default'
+        )
+        self.assertEqual(self.get(read_view).content, b'default default')
+        self.assertEqual(router.db_for_read(Post), 'default')
+
+    def test_client_sticks_to_primary_after_write(self):
+        response = self.get(use_replica(write_view))
+        self.assertEqual(response.content, b'default default')
+        cookie = response.cookies['db_primary']
+        self.assertEqual(cookie['max-age'], 10)
+        response = self.get(use_replica(read_view), db_primary='1')
+        self.assertEqual(response.content, b'default default')
+        self.assertNotIn('db_primary', response.cookies)
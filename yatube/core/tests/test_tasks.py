@@ -0,0 +1,119 @@
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from ..models import Task
+from ..tasks import claim, execute, release_stale, run_pending, task
+
+calls = []
+
+
+@task
+def record(value):
+    calls.append(value)
+
+
+@task(max_attempts=2)
+def explode(value):
+    calls.append(value)
+    raise ValueError(value)
+
+
+@override_settings(TASKS_EAGER=False, TASKS_RETRY_DELAY=10)
+class TaskQueueTest(TestCase):
+    def setUp(self):
+        super().setUp()
+        calls.clear()
+
+    def test_enqueued_task_runs_once_and_is_removed(self):
+        record.enqueue([1, 2])
+        self.assertEqual(calls, [])
+        self.assertEqual(run_pending(), 1)
+        self.assertEqual(calls, [[1, 2]])
+        self.assertFalse(Task.objects.exists())
+
+    def test_pending_tasks_with_same_key_collapse(self):
+        record.enqueue(1, key=1)
+        record.enqueue(2, key=1)
+        record.enqueue(3, key=2)
+        self.assertEqual(Task.objects.count(), 2)
+        run_pending()
+        self.assertEqual(calls, [1, 3])
+
+    def test_running_task_does_not_block_new_one(self):
+        """Новая задача с тем же ключом встаёт в очередь, если прежняя
+        уже выполняется: она могла прочитать старые данные."""
+        record.enqueue(1, key='post')
+        claim('worker', 10)
+        record.enqueue(2, key='post')
+        self.assertEqual(Task.objects.count(), 2)
+
+    def test_delayed_task_waits(self):
+        record.enqueue(1, delay=60)
+        self.assertEqual(run_pending(), 0)
+
+    def test_failed_task_is_retried_with_backoff(self):
+        explode.enqueue('boom')
+        started = timezone.now()
+        with mock.patch('core.tasks.logger'):
+            run_pending()
+        failed = Task.objects.get()
+        self.assertEqual(failed.status, Task.PENDING)
+        self.assertEqual(failed.attempts, 1)
+        self.assertIn('ValueError: boom', failed.error)
+        self.assertGreaterEqual(
+            failed.run_at, started + timedelta(seconds=5)
+        )
+        Task.objects.update(run_at=timezone.now())
+        with mock.patch('core.tasks.logger'):
+            run_pending()
+        failed = Task.objects.get()
+        self.assertEqual(failed.status, Task.FAILED)
+        self.assertEqual(failed.attempts, 2)
+        self.assertEqual(calls, ['boom', 'boom'])
+
+    def test_retry_yields_to_newer_task_with_same_key(self):
+        explode.enqueue('first', key='x')
+        claimed = claim('worker', 10)
+        explode.enqueue('second', key='x')
+        with mock.patch('core.tasks.logger'):
+            execute(claimed[0])
+        self.assertEqual(
+            list(Task.objects.values_list('args', flat=True)), ['["second"]']
+        )
+
+    @override_settings(TASKS_LOCK_TIMEOUT=60)
+    def test_stale_tasks_return_to_queue(self):
+        record.enqueue(1)
+        claim('crashed', 10)
+        release_stale()
+        self.assertEqual(Task.objects.get().status, Task.RUNNING)
+        Task.objects.update(locked_at=timezone.now() - timedelta(minutes=2))
+        with mock.patch('core.tasks.logger'):
+            release_stale()
+        stale = Task.objects.get()
+        self.assertEqual(stale.status, Task.PENDING)
+        self.assertIn('crashed', stale.error)
+
+    @override_settings(TASKS_EAGER=True)
+    def test_eager_tasks_run_after_commit(self):
+        with mock.patch(
+            'core.tasks.transaction.on_commit', side_effect=lambda f: f()
+        ) as on_commit:
+            record.enqueue((1, 2))
+        on_commit.assert_called_once()
+        self.assertEqual(calls, [[1, 2]])
+        self.assertFalse(Task.objects.exists())
+
+    def test_run_workers_once(self):
+        record.enqueue(1)
+        record.enqueue(2)
+        call_command(
+            'run_workers', once=True, threads=1, stdout=StringIO()
+        )
+        self.assertEqual(calls, [1, 2])
+        self.assertFalse(Task.objects.exists())
@@ -1,4 +1,15 @@
+import json
+
+from django.conf import settings
+from django.http import Http404, HttpResponse, JsonResponse
 from django.shortcuts import render
+from django.utils.cache import patch_cache_control
+from django.utils.crypto import constant_time_compare
+from django.views.static import serve
+
+from .cache import cache_stats, stats_to_prometheus
+from .metrics import registry
+from .storage import is_content_addressed
 
 
 def csrf_failure(request, reason=''):
@@ -7,3 +18,41 @@ def csrf_failure(request, reason=''):
 
 def page_not_found(request, exception):
     return render(request, 'core/404.html', {'path': request.path}, status=404)
+
+
+def metrics_allowed(request):
+    """Метрики видит персонал сайта или запрос с токеном METRICS_TOKEN."""
+    token = settings.METRICS_TOKEN
+    if token and constant_time_compare(
+        request.META.get('HTTP_AUTHORIZATION', ''), f'Bearer {token}'
+    ):
+        return True
+    return request.user.is_active and request.user.is_staff
+
+
+def metrics(request):
+    """Метрики процесса в формате Prometheus или JSON (?format=json)."""
+    if not metrics_allowed(request):
+        raise Http404
+    if request.GET.get('format') == 'json':
+        data = json.loads(registry.to_json())
+        data['cache'] = cache_stats()
+        return JsonResponse(data, json_dumps_params={'ensure_ascii': False})
+    return HttpResponse(
+        registry.to_prometheus() + stats_to_prometheus(),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
+
+
+def serve_media(request, path, document_root=None, show_indexes=False):
+    """Отдаёт файлы MEDIA_ROOT при DEBUG; файлы с именами по содержимому
+    не меняются и кэшируются навсегда."""
+    response = serve(request, path, document_root, show_indexes)
+    if response.status_code == 200 and is_content_addressed(path):
+        patch_cache_control(
+            response,
+            public=True,
+            max_age=settings.MEDIA_IMMUTABLE_MAX_AGE,
+            immutable=True,
+        )
+    return response
@@ -0,0 +1,10 @@
+from django.contrib import admin
+
+from .models import DigestSubscription
+
+
+@admin.register(DigestSubscription)
+class DigestSubscriptionAdmin(admin.ModelAdmin):
+    list_display = ('user', 'frequency', 'last_sent_at')
+    list_filter = ('frequency',)
+    search_fields = ('user__username',)
@@ -0,0 +1,138 @@
+"""Дайджесты новых постов авторов из подписок.
+
+Публикация поста добавляет одну строку PostEvent. Команда send_digests,
+запускаемая раз в час, проходит подписчиков авторов с недавними
+событиями пачками по DIGEST_BATCH_SIZE и каждому, у кого подошёл срок
+(раз в час или раз в день по DigestSubscription), отправляет одно письмо
+со всеми постами после прошлого дайджеста. Все письма запуска уходят
+через одно соединение с почтовым сервером. События старше
+DIGEST_RETENTION_DAYS удаляются.
+"""
+from collections import defaultdict
+from datetime import timedelta
+from itertools import islice
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils import timezone
+
+from posts.models import Follow
+
+from .models import DigestSubscription, PostEvent
+
+SUBJECT = 'Новые посты в ваших подписках'
+# Запуски по расписанию немного плавают, поэтому дайджест, до срока
+# которого осталось меньше SCHEDULE_SLACK, отправляется сейчас.
+SCHEDULE_SLACK = timedelta(minutes=5)
+
+
+def is_due(subscription, now):
+    period = subscription.period
+    if period is None:
+        return False
+    return (
+        subscription.last_sent_at is None
+        or subscription.last_sent_at <= now - period + SCHEDULE_SLACK
+    )
+
+
+def build_message(user, events):
+    """Письмо с постами событий, от новых к старым."""
+    limit = settings.DIGEST_MAX_POSTS
+    posts = [
+        {
+            'post': event.post,
+            'author': event.author,
+            'url': settings.SITE_URL + reverse(
+                'posts:post_detail', args=[event.post_id]
+            ),
+        }
+        for event in events[:limit]
+    ]
+    body = render_to_string('notifications/digest.txt', {
+        'user': user,
+        'posts': posts,
+        'more': max(len(events) - limit, 0),
+        'follow_url': settings.SITE_URL + reverse('posts:follow_index'),
+    })
+    return EmailMessage(SUBJECT, body, to=[user.email])
+
+
+def _digest_batch(user_ids, now, horizon):
+    """Письма для подписчиков из user_ids, которым пора их получить."""
+    DigestSubscription.objects.bulk_create(
+        [DigestSubscription(user_id=user_id) for user_id in user_ids],
+        ignore_conflicts=True,
+    )
+    subscriptions = DigestSubscription.objects.filter(
+        user_id__in=user_ids
+    ).exclude(user__email='').select_related('user')
+    due = {
+        subscription.user_id: subscription
+        for subscription in subscriptions
+        if is_due(subscription, now)
+    }
+    if not due:
+        return []
+    since = {
+        user_id: max(
+            subscription.last_sent_at or now - subscription.period, horizon
+        )
+        for user_id, subscription in due.items()
+    }
+    authors = defaultdict(list)
+    for user_id, author_id in Follow.objects.filter(
+        user_id__in=due
+    ).values_list('user_id', 'author_id'):
+        authors[user_id].append(author_id)
+    events = defaultdict(list)
+    for event in PostEvent.objects.filter(
+        author_id__in={pk for pks in authors.values() for pk in pks},
+        created__gt=min(since.values()),
+    ).select_related('post', 'author'):
+        events[event.author_id].append(event)
+    messages = []
+    for user_id, subscription in due.items():
+        fresh = sorted(
+            (
+                event
+                for author_id in authors[user_id]
+                for event in events[author_id]
+                if event.created > since[user_id]
+            ),
+            key=lambda event: event.created,
+            reverse=True,
+        )
+        if fresh:
+            messages.append((user_id, build_message(subscription.user, fresh)))
+    return messages
+
+
+def send_digests(now=None):
+    """Отправляет подошедшие дайджесты; возвращает число писем."""
+    now = now or timezone.now()
+    horizon = now - timedelta(days=settings.DIGEST_RETENTION_DAYS)
+    recipients = Follow.objects.filter(
+        author__in=PostEvent.objects.filter(
+            created__gt=horizon
+        ).values('author')
+    ).values_list('user_id', flat=True).distinct().order_by('user_id')
+    recipients = recipients.iterator()
+    sent = 0
+    with get_connection() as connection:
+        while True:
+            user_ids = list(islice(recipients, settings.DIGEST_BATCH_SIZE))
+            if not user_ids:
+                break
+            messages = _digest_batch(user_ids, now, horizon)
+            if not messages:
+                continue
+            connection.send_messages([message for _, message in messages])
+            DigestSubscription.objects.filter(
+                user_id__in=[user_id for user_id, _ in messages]
+            ).update(last_sent_at=now)
+            sent += len(messages)
+    PostEvent.objects.filter(created__lte=horizon).delete()
+    return sent
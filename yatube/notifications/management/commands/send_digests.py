@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from notifications.digests import send_digests
+
+
+class Command(BaseCommand):
+    help = (
+        'Рассылает дайджесты новых постов из подписок. '
+        'Запускается по расписанию раз в час.'
+    )
+
+    def handle(self, *args, **options):
+        sent = send_digests()
+        self.stdout.write(self.style.SUCCESS(f'Отправлено дайджестов: {sent}'))
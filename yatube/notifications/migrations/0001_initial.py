@@ -0,0 +1,49 @@
+# Generated by Django 2.2.16 on 2026-10-17 18:24
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('auth', '0011_update_proxy_permissions'),
+        ('posts', '0024_post_updated'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DigestSubscription',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='digest_subscription', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+                ('frequency', models.CharField(choices=[('hourly', 'Раз в час'), ('daily', 'Раз в день'), ('never', 'Не присылать')], default='daily', max_length=10, verbose_name='Частота')),
+                ('last_sent_at', models.DateTimeField(blank=True, null=True, verbose_name='Последний дайджест')),
+            ],
+            options={
+                'verbose_name': 'Подписка на дайджест',
+                'verbose_name_plural': 'Подписки на дайджест',
+            },
+        ),
+        migrations.CreateModel(
+            name='PostEvent',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Дата публикации')),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Автор')),
+                ('post', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='posts.Post', verbose_name='Пост')),
+            ],
+            options={
+                'verbose_name': 'Событие для дайджеста',
+                'verbose_name_plural': 'События для дайджестов',
+                'ordering': ('-created',),
+            },
+        ),
+        migrations.AddIndex(
+            model_name='postevent',
+            index=models.Index(fields=['author', '-created'], name='postevent_author_created_idx'),
+        ),
+    ]
@@ -0,0 +1,91 @@
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.db import models
+
+from posts.models import Post
+
+User = get_user_model()
+
+
+class PostEvent(models.Model):
+    """Публикация поста для дайджестов подписчиков.
+
+    Одна строка на пост, сколько бы ни было подписчиков: получатели
+    находятся по подпискам при рассылке.
+    """
+    post = models.OneToOneField(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Пост',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор',
+    )
+    created = models.DateTimeField(
+        auto_now_add=True,
+        db_index=True,
+        verbose_name='Дата публикации',
+    )
+
+    class Meta:
+        ordering = ('-created',)
+        verbose_name = 'Событие для дайджеста'
+        verbose_name_plural = 'События для дайджестов'
+        indexes = [
+            models.Index(
+                name='postevent_author_created_idx',
+                fields=['author', '-created'],
+            ),
+        ]
+
+
+class DigestSubscription(models.Model):
+    """Как часто пользователь получает дайджест и когда получил
+    последний."""
+    HOURLY = 'hourly'
+    DAILY = 'daily'
+    NEVER = 'never'
+    FREQUENCY_CHOICES = (
+        (HOURLY, 'Раз в час'),
+        (DAILY, 'Раз в день'),
+        (NEVER, 'Не присылать'),
+    )
+    PERIODS = {
+        HOURLY: timedelta(hours=1),
+        DAILY: timedelta(days=1),
+    }
+
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='digest_subscription',
+        verbose_name='Пользователь',
+    )
+    frequency = models.CharField(
+        max_length=10,
+        choices=FREQUENCY_CHOICES,
+        default=DAILY,
+        verbose_name='Частота',
+    )
+    last_sent_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Последний дайджест',
+    )
+
+    class Meta:
+        verbose_name = 'Подписка на дайджест'
+        verbose_name_plural = 'Подписки на дайджест'
+
+    def __str__(self):
+        return f'{self.user} ({self.get_frequency_display()})'
+
+    @property
+    def period(self):
+        return self.PERIODS.get(self.frequency)
@@ -0,0 +1,14 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from posts.models import Post
+
+from .models import PostEvent
+
+
+@receiver(post_save, sender=Post)
+def record_new_post(sender, instance, created, **kwargs):
+    # Подписчикам ничего не отправляется сразу: пост попадёт
+    # в их ближайшие дайджесты.
+    if created:
+        PostEvent.objects.create(post=instance, author_id=instance.author_id)
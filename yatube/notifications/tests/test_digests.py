@@ -0,0 +1,96 @@
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.mail.backends.locmem import EmailBackend
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from posts.models import Follow, Post
+
+from ..digests import send_digests
+from ..models import DigestSubscription, PostEvent
+
+User = get_user_model()
+
+
+class DigestTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='author')
+        cls.other = User.objects.create(username='other')
+        cls.readers = [
+            User.objects.create(
+                username=f'reader{number}', email=f'reader{number}@ya.ru'
+            )
+            for number in range(3)
+        ]
+        for reader in cls.readers:
+            Follow.objects.create(user=reader, author=cls.author)
+        Follow.objects.create(user=cls.readers[0], author=cls.other)
+        cls.silent = User.objects.create(username='silent')
+        Follow.objects.create(user=cls.silent, author=cls.author)
+
+    def publish(self, author, text='Пост'):
+        return Post.objects.create(author=author, text=text)
+
+    def test_post_creates_single_event_without_sending(self):
+        self.publish(self.author)
+        self.assertEqual(PostEvent.objects.count(), 1)
+        self.assertEqual(mail.outbox, [])
+
+    @override_settings(DIGEST_BATCH_SIZE=2)
+    def test_digests_share_one_connection(self):
+        self.publish(self.author, 'Первый пост')
+        self.publish(self.other, 'Пост другого автора')
+        with mock.patch.object(
+            EmailBackend, 'open', autospec=True, return_value=True
+        ) as opened:
+            self.assertEqual(send_digests(), 3)
+        opened.assert_called_once()
+        self.assertEqual(
+            sorted(message.to[0] for message in mail.outbox),
+            [reader.email for reader in self.readers],
+        )
+        bodies = {message.to[0]: message.body for message in mail.outbox}
+        self.assertIn('Пост другого автора', bodies[self.readers[0].email])
+        self.assertIn('Первый пост', bodies[self.readers[0].email])
+        self.assertNotIn('другого', bodies[self.readers[1].email])
+
+    def test_readers_get_at_most_one_digest_per_period(self):
+        DigestSubscription.objects.create(
+            user=self.readers[0], frequency=DigestSubscription.HOURLY
+        )
+        DigestSubscription.objects.create(
+            user=self.readers[1], frequency=DigestSubscription.NEVER
+        )
+        self.publish(self.author)
+        self.assertEqual(send_digests(), 2)
+        now = DigestSubscription.objects.get(user=self.readers[0]).last_sent_at
+        self.publish(self.author, 'Второй пост')
+        self.assertEqual(send_digests(now + timedelta(minutes=10)), 0)
+        mail.outbox.clear()
+        self.assertEqual(send_digests(now + timedelta(hours=1)), 1)
+        self.assertEqual(mail.outbox[0].to, [self.readers[0].email])
+        self.assertIn('Второй пост', mail.outbox[0].body)
+        self.assertNotIn('\nПост\n', mail.outbox[0].body)
+
+    @override_settings(DIGEST_MAX_POSTS=2)
+    def test_long_digest_is_truncated(self):
+        for number in range(5):
+            self.publish(self.author, f'Пост {number}')
+        send_digests()
+        body = mail.outbox[0].body
+        self.assertIn('Пост 4', body)
+        self.assertNotIn('Пост 2', body)
+        self.assertIn('И ещё постов: 3.', body)
+
+    def test_old_events_are_removed(self):
+        self.publish(self.author)
+        call_command('send_digests', stdout=StringIO())
+        self.assertEqual(PostEvent.objects.count(), 1)
+        send_digests(timezone.now() + timedelta(days=8))
+        self.assertFalse(PostEvent.objects.exists())
@@ -0,0 +1,103 @@
+"""Потоковая выгрузка всех постов автора с комментариями.
+
+Посты читаются iterator() пачками по ARCHIVE_CHUNK_SIZE, комментарии
+к пачке - одним запросом, поэтому память не зависит от числа постов.
+Архив отдаётся в JSON Lines (пост с комментариями на строку) или одним
+HTML-файлом <username>.html в zip, который пишется и отдаётся по частям.
+"""
+import io
+import json
+import zipfile
+from itertools import islice
+
+from django.core.files.storage import default_storage
+from django.template.loader import render_to_string
+from django.utils.html import escape
+
+from .models import Comment
+
+ARCHIVE_CHUNK_SIZE = 1000
+
+
+def archive_chunks(author, chunk_size=None):
+    """Пачки постов автора в виде словарей с комментариями."""
+    chunk_size = chunk_size or ARCHIVE_CHUNK_SIZE
+    posts = author.posts.order_by('pk').values(
+        'id', 'text', 'pub_date', 'group__slug', 'image'
+    ).iterator(chunk_size)
+    while True:
+        chunk = list(islice(posts, chunk_size))
+        if not chunk:
+            return
+        comments = {post['id']: [] for post in chunk}
+        for post_id, username, text, created in Comment.objects.filter(
+            post_id__in=comments
+        ).order_by('created', 'pk').values_list(
+            'post_id', 'author__username', 'text', 'created'
+        ).iterator(chunk_size):
+            comments[post_id].append({
+                'author': username,
+                'text': text,
+                'created': created.isoformat(),
+            })
+        yield [
+            {
+                'id': post['id'],
+                'text': post['text'],
+                'pub_date': post['pub_date'].isoformat(),
+                'group': post['group__slug'] or '',
+                'image': (
+                    default_storage.url(post['image'])
+                    if post['image'] else ''
+                ),
+                'comments': comments[post['id']],
+            }
+            for post in chunk
+        ]
+
+
+def jsonl_archive(author):
+    for chunk in archive_chunks(author):
+        yield ''.join(
+            json.dumps(post, ensure_ascii=False) + '\n' for post in chunk
+        ).encode()
+
+
+class _ChunkStream(io.RawIOBase):
+    """Поток без перемотки, из которого забираются записанные байты."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def pop(self):
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def html_zip_archive(author):
+    """Zip с файлом <username>.html; zipfile пишет его в поток без
+    перемотки, поэтому части архива отдаются по мере готовности."""
+    stream = _ChunkStream()
+    with zipfile.ZipFile(stream, 'w', zipfile.ZIP_DEFLATED) as archive:
+        with archive.open(f'{author.username}.html', 'w') as page:
+            title = escape(f'Записи {author.get_full_name()}')
+            page.write(
+                f'<!DOCTYPE html><html lang="ru"><head><meta charset="utf-8">'
+                f'<title>{title}</title></head><body><h1>{title}</h1>'
+                .encode()
+            )
+            for chunk in archive_chunks(author):
+                page.write(render_to_string(
+                    'posts/includes/archive_posts.html', {'posts': chunk}
+                ).encode())
+                yield stream.pop()
+            page.write(b'</body></html>')
+    yield stream.pop()
@@ -0,0 +1,190 @@
+"""Кэш страниц лент с инвалидацией по поколениям.
+
+У каждой ленты (главная, группа, профиль) есть счётчик поколения, который
+увеличивают сигналы сохранения и удаления постов, комментариев и групп.
+Закэшированная страница действительна, пока совпадает её поколение.
+Устаревшую страницу перестраивает один запрос под блокировкой, остальные
+в это время получают старую версию (stale-while-revalidate).
+Поколение - время последнего изменения ленты в наносекундах, из него же
+без обращения к базе строятся ETag и Last-Modified для условных GET.
+Страницы лент одинаковы для всех посетителей (данные пользователя
+подгружает js/personal.js), поэтому ключи от пользователя не зависят.
+
+Карточки постов кэшируются отдельно, с ключом по id поста и дате его
+изменения, поэтому правка поста перестраивает только его карточку.
+"""
+import hashlib
+import time
+from datetime import datetime, timezone
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.template.loader import render_to_string
+from django.utils.cache import patch_cache_control
+from django.utils.safestring import mark_safe
+from django.views.decorators.http import condition
+
+POST_CARD_TEMPLATE = 'posts/includes/post_card.html'
+
+
+def _key(prefix, *parts):
+    digest = hashlib.md5('|'.join(map(str, parts)).encode()).hexdigest()
+    return f'{prefix}:{digest}'
+
+
+def index_feed():
+    return 'index'
+
+
+def group_feed(slug):
+    return f'group:{slug}'
+
+
+def profile_feed(username):
+    return f'profile:{username}'
+
+
+def post_feeds(post):
+    """Ленты, на страницах которых показывается пост."""
+    feeds = [index_feed(), profile_feed(post.author.username)]
+    if post.group_id is not None:
+        feeds.append(group_feed(post.group.slug))
+    return feeds
+
+
+def get_generation(feed):
+    # Начальное значение берётся от времени, чтобы после вытеснения
+    # счётчика из кэша не совпасть с поколением старых страниц.
+    return cache.get_or_set(
+        _key('feed_generation', feed), time.time_ns, timeout=None
+    )
+
+
+def bump_generation(*feeds):
+    keys = [_key('feed_generation', feed) for feed in feeds]
+    current = cache.get_many(keys)
+    now = time.time_ns()
+    # Новое поколение обязано отличаться от прежнего даже при грубых часах.
+    cache.set_many(
+        {key: max(now, current.get(key, 0) + 1) for key in keys},
+        timeout=None,
+    )
+
+
+def feed_modified(feed):
+    """Время последнего изменения ленты."""
+    return datetime.fromtimestamp(get_generation(feed) / 1e9, timezone.utc)
+
+
+def acquire_rebuild_lock(key):
+    return cache.add(
+        _key('feed_lock', key), True, settings.FEED_CACHE_LOCK_TIMEOUT
+    )
+
+
+def release_rebuild_lock(key):
+    cache.delete(_key('feed_lock', key))
+
+
+def cached_feed(get_feed):
+    """Кэширует GET-ответы view ленты до смены поколения ленты.
+
+    get_feed получает аргументы view и возвращает имя ленты.
+    Ответы различаются по полному пути запроса.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method != 'GET':
+                return view(request, *args, **kwargs)
+            feed = get_feed(*args, **kwargs)
+            generation = get_generation(feed)
+            key = _key('feed_page', feed, request.get_full_path())
+            entry = cache.get(key)
+            if entry is not None and entry[0] == generation:
+                return HttpResponse(entry[1])
+            locked = acquire_rebuild_lock(key)
+            if entry is not None and not locked:
+                return HttpResponse(entry[1])
+            try:
+                response = view(request, *args, **kwargs)
+                if response.status_code == 200:
+                    cache.set(
+                        key,
+                        (generation, response.content),
+                        settings.FEED_CACHE_TIMEOUT,
+                    )
+            finally:
+                if locked:
+                    release_rebuild_lock(key)
+            return response
+        return wrapper
+    return decorator
+
+
+def conditional_feed(get_feed):
+    """Отвечает 304 Not Modified, если лента не менялась.
+
+    ETag зависит от поколения ленты и полного пути запроса (с номером
+    страницы или курсором), поэтому проверка обходится без запросов
+    к базе и рендеринга шаблонов.
+    """
+    def etag(request, *args, **kwargs):
+        return _key(
+            'feed_etag',
+            get_generation(get_feed(*args, **kwargs)),
+            request.get_full_path(),
+        )
+
+    def last_modified(request, *args, **kwargs):
+        return feed_modified(get_feed(*args, **kwargs))
+
+    return condition(etag_func=etag, last_modified_func=last_modified)
+
+
+def shared_page(view):
+    """Разрешает CDN хранить GET-ответ view EDGE_CACHE_TIMEOUT секунд.
+
+    Такой view не должен зависеть от пользователя: его страница одна на
+    всех, а браузер перепроверяет её при каждом показе.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        response = view(request, *args, **kwargs)
+        if request.method in ('GET', 'HEAD') and response.status_code == 200:
+            patch_cache_control(
+                response,
+                public=True,
+                max_age=0,
+                s_maxage=settings.EDGE_CACHE_TIMEOUT,
+            )
+        return response
+    return wrapper
+
+
+def post_card_key(post, options):
+    return _key(
+        'post_card', post.pk, post.updated.isoformat(),
+        *sorted(options.items()),
+    )
+
+
+def render_post_cards(posts, **options):
+    """Список HTML карточек постов; options передаются в шаблон.
+
+    Готовые карточки читаются из кэша одним get_many, недостающие
+    рендерятся и сохраняются одним set_many.
+    """
+    keys = [(post, post_card_key(post, options)) for post in posts]
+    cards = cache.get_many([key for _, key in keys])
+    missing = {}
+    for post, key in keys:
+        if key not in cards:
+            missing[key] = cards[key] = render_to_string(
+                POST_CARD_TEMPLATE, {'post': post, **options}
+            )
+    if missing:
+        cache.set_many(missing, settings.POST_CARD_CACHE_TIMEOUT)
+    return [mark_safe(cards[key]) for _, key in keys]
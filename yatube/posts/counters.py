@@ -0,0 +1,126 @@
+"""Денормализованные счётчики постов, комментариев и подписок.
+
+Счётчики меняются атомарными UPDATE ... SET x = x + 1 из сигналов записи,
+поэтому страницам не нужны агрегирующие запросы. Команда
+rebuild_counters сверяет их с реальными данными и исправляет расхождения.
+"""
+from collections import defaultdict
+
+from django.db.models import Count, F
+
+from .models import Follow, Post, User, UserStats
+
+STATS_FIELDS = ('posts_count', 'followers_count', 'following_count')
+
+
+def change_user_stats(user_id, **deltas):
+    updates = {field: F(field) + delta for field, delta in deltas.items()}
+    updated = UserStats.objects.filter(user_id=user_id).update(**updates)
+    # Уменьшать нечего, если записи нет; к тому же при каскадном удалении
+    # пользователя новая запись сослалась бы на удаляемую строку.
+    if updated or min(deltas.values()) < 0:
+        return
+    UserStats.objects.get_or_create(user_id=user_id)
+    UserStats.objects.filter(user_id=user_id).update(**updates)
+
+
+def add_posts_counts(counts):
+    """Увеличивает posts_count сразу многим авторам: counts - словарь
+    {user_id: прирост}. Авторы с одинаковым приростом обновляются одним
+    UPDATE."""
+    existing = set(UserStats.objects.filter(
+        user_id__in=counts
+    ).values_list('user_id', flat=True))
+    UserStats.objects.bulk_create(
+        (UserStats(user_id=user_id) for user_id in counts
+         if user_id not in existing),
+        ignore_conflicts=True,
+    )
+    by_delta = defaultdict(list)
+    for user_id, delta in counts.items():
+        by_delta[delta].append(user_id)
+    for delta, user_ids in by_delta.items():
+        UserStats.objects.filter(user_id__in=user_ids).update(
+            posts_count=F('posts_count') + delta
+        )
+
+
+def change_comments_count(post_id, delta):
+    Post.objects.filter(pk=post_id).update(
+        comments_count=F('comments_count') + delta
+    )
+
+
+def get_stats(user):
+    """Счётчики пользователя; для пользователя без записи - нули."""
+    try:
+        return user.stats
+    except UserStats.DoesNotExist:
+        return UserStats(user=user)
+
+
+def _grouped_counts(queryset, field):
+    return dict(
+        queryset.order_by().values_list(field).annotate(total=Count('pk'))
+    )
+
+
+def actual_user_stats():
+    """Реальные значения счётчиков: {user_id: (посты, подписчики, подписки)}.
+
+    Каждый счётчик считается отдельной группировкой: общий JOIN трёх
+    таблиц размножил бы строки как произведение их количеств.
+    """
+    posts = _grouped_counts(Post.objects.all(), 'author')
+    followers = _grouped_counts(Follow.objects.all(), 'author')
+    following = _grouped_counts(Follow.objects.all(), 'user')
+    return {
+        user_id: (
+            posts.get(user_id, 0),
+            followers.get(user_id, 0),
+            following.get(user_id, 0),
+        )
+        for user_id in User.objects.values_list('pk', flat=True).iterator()
+    }
+
+
+def find_user_stats_drift():
+    """Возвращает {user_id: {поле: (сохранено, на самом деле)}}."""
+    stored = {
+        stats.pop('user_id'): stats
+        for stats in UserStats.objects.values('user_id', *STATS_FIELDS)
+    }
+    drift = {}
+    for user_id, counts in actual_user_stats().items():
+        saved = stored.get(user_id, dict.fromkeys(STATS_FIELDS, 0))
+        fields = {
+            field: (saved[field], count)
+            for field, count in zip(STATS_FIELDS, counts)
+            if saved[field] != count
+        }
+        if fields:
+            drift[user_id] = fields
+    return drift
+
+
+def find_comments_count_drift():
+    """Возвращает {post_id: (сохранено, на самом деле)}."""
+    posts = Post.objects.annotate(
+        actual_comments=Count('comments')
+    ).exclude(comments_count=F('actual_comments')).values_list(
+        'pk', 'comments_count', 'actual_comments'
+    )
+    return {pk: (saved, actual) for pk, saved, actual in posts.iterator()}
+
+
+def fix_user_stats(drift):
+    for user_id, fields in drift.items():
+        UserStats.objects.update_or_create(
+            user_id=user_id,
+            defaults={field: actual for field, (_, actual) in fields.items()},
+        )
+
+
+def fix_comments_count(drift):
+    for post_id, (_, actual) in drift.items():
+        Post.objects.filter(pk=post_id).update(comments_count=actual)
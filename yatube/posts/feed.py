@@ -0,0 +1,200 @@
+"""Материализованная лента подписок (fan-out on write).
+
+При публикации пост раскладывается по лентам подписчиков автора, поэтому
+чтение ленты - выборка по индексу (user, pub_date) таблицы FeedEntry.
+Посты популярных авторов (подписчиков больше FEED_FANOUT_CAP) не
+раскладываются, а подтягиваются при чтении ленты. Когда автор перестаёт
+быть популярным, фоновая задача раскладывает его посты по лентам всех
+подписчиков: иначе посты и подписки того времени пропали бы из лент.
+"""
+from collections import defaultdict
+
+from django.conf import settings
+from django.db.models import F, Q
+
+from core.tasks import task
+
+from .models import FeedEntry, Follow, Post, User, UserStats
+from .utils import bulk_create_chunked
+
+FEED_DATE_FIELD = 'feed_date'
+
+
+def is_popular(author):
+    return UserStats.objects.filter(
+        user=author, followers_count__gt=settings.FEED_FANOUT_CAP
+    ).exists()
+
+
+def popular_authors(user):
+    """Авторы из подписок пользователя, чьи посты читаются без fan-out."""
+    return User.objects.filter(
+        following__user=user,
+        stats__followers_count__gt=settings.FEED_FANOUT_CAP,
+    )
+
+
+def fan_out_post(post):
+    """Добавляет пост в ленты всех подписчиков автора."""
+    if is_popular(post.author):
+        return
+    follower_ids = Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list('user_id', flat=True)
+    bulk_create_chunked(
+        FeedEntry,
+        (
+            FeedEntry(
+                user_id=user_id,
+                post=post,
+                author_id=post.author_id,
+                pub_date=post.pub_date,
+            ) for user_id in follower_ids.iterator()
+        ),
+        settings.FEED_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def fan_out_posts(posts):
+    """Раскладывает по лентам подписчиков посты, созданные в обход
+    сигналов; posts - кортежи (pk, author_id, pub_date)."""
+    by_author = defaultdict(list)
+    for post_id, author_id, pub_date in posts:
+        by_author[author_id].append((post_id, pub_date))
+    popular = UserStats.objects.filter(
+        user_id__in=by_author,
+        followers_count__gt=settings.FEED_FANOUT_CAP,
+    ).values_list('user_id', flat=True)
+    follows = Follow.objects.filter(
+        author_id__in=set(by_author) - set(popular)
+    ).values_list('author_id', 'user_id')
+    bulk_create_chunked(
+        FeedEntry,
+        (
+            FeedEntry(
+                user_id=user_id,
+                post_id=post_id,
+                author_id=author_id,
+                pub_date=pub_date,
+            )
+            for author_id, user_id in follows.iterator()
+            for post_id, pub_date in by_author[author_id]
+        ),
+        settings.FEED_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def backfill(user, author):
+    """Заполняет ленту постами автора при подписке: последние
+    FEED_BACKFILL_LIMIT сразу, остальные - фоновой задачей."""
+    if is_popular(author):
+        return
+    posts = list(Post.objects.filter(author=author).values_list(
+        'pk', 'pub_date'
+    )[:settings.FEED_BACKFILL_LIMIT])
+    bulk_create_chunked(
+        FeedEntry,
+        (
+            FeedEntry(
+                user=user,
+                post_id=post_id,
+                author=author,
+                pub_date=pub_date,
+            ) for post_id, pub_date in posts
+        ),
+        settings.FEED_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+    if len(posts) == settings.FEED_BACKFILL_LIMIT:
+        backfill_rest.enqueue(
+            user.pk, author.pk, key=f'{user.pk}:{author.pk}'
+        )
+
+
+@task
+def backfill_rest(user_id, author_id):
+    """Раскладывает в ленту подписчика все посты автора."""
+    if is_popular(author_id) or not Follow.objects.filter(
+        user_id=user_id, author_id=author_id
+    ).exists():
+        return
+    posts = Post.objects.filter(author_id=author_id).values_list(
+        'pk', 'pub_date'
+    )
+    bulk_create_chunked(
+        FeedEntry,
+        (
+            FeedEntry(
+                user_id=user_id,
+                post_id=post_id,
+                author_id=author_id,
+                pub_date=pub_date,
+            ) for post_id, pub_date in posts.iterator()
+        ),
+        settings.FEED_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def schedule_refill(author_id):
+    """Ставит refill_followers, если после отписки число подписчиков
+    автора опустилось до FEED_FANOUT_CAP."""
+    if UserStats.objects.filter(
+        user_id=author_id, followers_count=settings.FEED_FANOUT_CAP
+    ).exists():
+        refill_followers.enqueue(author_id, key=author_id)
+
+
+@task
+def refill_followers(author_id):
+    """Раскладывает все посты автора по лентам всех подписчиков."""
+    if is_popular(author_id):
+        return
+    posts = list(Post.objects.filter(author_id=author_id).values_list(
+        'pk', 'pub_date'
+    ))
+    follower_ids = Follow.objects.filter(
+        author_id=author_id
+    ).values_list('user_id', flat=True)
+    bulk_create_chunked(
+        FeedEntry,
+        (
+            FeedEntry(
+                user_id=user_id,
+                post_id=post_id,
+                author_id=author_id,
+                pub_date=pub_date,
+            )
+            for user_id in follower_ids.iterator()
+            for post_id, pub_date in posts
+        ),
+        settings.FEED_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def prune(user, author):
+    """Убирает из ленты посты автора при отписке."""
+    FeedEntry.objects.filter(user=user, author=author).delete()
+
+
+def follow_feed(user):
+    """Посты ленты подписок пользователя с датой ленты в поле
+    FEED_DATE_FIELD, по которому ленту нужно сортировать.
+
+    Без популярных авторов лента читается соединением с FeedEntry
+    по индексу (user, -pub_date, -post), без сортировки всех постов ленты.
+    """
+    pulled = list(popular_authors(user).values_list('pk', flat=True))
+    if not pulled:
+        return Post.objects.filter(feed_entries__user=user).annotate(
+            **{FEED_DATE_FIELD: F('feed_entries__pub_date')}
+        )
+    condition = Q(
+        pk__in=FeedEntry.objects.filter(user=user).values('post_id')
+    ) | Q(author__in=pulled)
+    return Post.objects.filter(condition).annotate(
+        **{FEED_DATE_FIELD: F('pub_date')}
+    )
@@ -1,5 +1,7 @@
+from django.core.files.uploadedfile import UploadedFile
 from django.forms import ModelForm, ValidationError
 
+from .images import process_image
 from .models import Comment, Post
 
 
@@ -14,6 +16,29 @@ class PostForm(ModelForm):
                 raise ValidationError('Вы должны написать сообщение!')
             return data
 
+    def clean_image(self):
+        """Новая картинка уменьшается и перекодируется до сохранения."""
+        image = self.cleaned_data['image']
+        if not isinstance(image, UploadedFile):
+            return image
+        try:
+            image, width, height = process_image(image)
+        except (OSError, ValueError):
+            raise ValidationError(
+                self.fields['image'].error_messages['invalid_image'],
+                code='invalid_image',
+            )
+        self.image_meta = (width, height, image.size)
+        return image
+
+    def save(self, commit=True):
+        if 'image' in self.changed_data:
+            post = self.instance
+            post.image_width, post.image_height, post.image_size = getattr(
+                self, 'image_meta', (None, None, None)
+            )
+        return super().save(commit)
+
 
 class CommentForm(ModelForm):
     class Meta:
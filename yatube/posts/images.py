@@ -0,0 +1,67 @@
+"""Обработка загруженных картинок постов.
+
+Загрузка декодируется Pillow один раз: картинка поворачивается по тегу
+ориентации EXIF, уменьшается так, чтобы большая сторона была не больше
+POST_IMAGE_MAX_SIDE пикселей, и перекодируется в POST_IMAGE_FORMAT
+с качеством POST_IMAGE_QUALITY. EXIF и прочие метаданные в новый файл
+не переносятся, сохраняется только цветовой профиль. У анимаций остаётся
+первый кадр.
+"""
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps, features
+
+EXTENSIONS = {'WEBP': 'webp', 'JPEG': 'jpg'}
+
+
+def output_format():
+    """POST_IMAGE_FORMAT, а если Pillow собран без WebP - JPEG."""
+    if settings.POST_IMAGE_FORMAT == 'WEBP' and not features.check('webp'):
+        return 'JPEG'
+    return settings.POST_IMAGE_FORMAT
+
+
+def _has_alpha(image):
+    return image.mode in ('RGBA', 'LA', 'PA') or (
+        image.mode == 'P' and 'transparency' in image.info
+    )
+
+
+def _convert(image, fmt):
+    if not _has_alpha(image):
+        return image if image.mode == 'RGB' else image.convert('RGB')
+    image = image.convert('RGBA')
+    if fmt != 'JPEG':
+        return image
+    # В JPEG нет прозрачности: картинка кладётся на белый фон.
+    background = Image.new('RGB', image.size, 'white')
+    background.paste(image, mask=image.getchannel('A'))
+    return background
+
+
+def process_image(upload):
+    """Перекодированная картинка: (ContentFile, ширина, высота).
+
+    Имя файла - имя загрузки с расширением нового формата.
+    """
+    fmt = output_format()
+    upload.seek(0)
+    with Image.open(upload) as source:
+        icc_profile = source.info.get('icc_profile')
+        image = ImageOps.exif_transpose(source)
+    side = settings.POST_IMAGE_MAX_SIDE
+    image.thumbnail((side, side), Image.LANCZOS)
+    image = _convert(image, fmt)
+    buffer = BytesIO()
+    options = {'quality': settings.POST_IMAGE_QUALITY}
+    if icc_profile:
+        options['icc_profile'] = icc_profile
+    if fmt == 'JPEG':
+        options.update(optimize=True, progressive=True)
+    image.save(buffer, fmt, **options)
+    stem = os.path.splitext(os.path.basename(upload.name))[0]
+    name = f'{stem}.{EXTENSIONS.get(fmt, fmt.lower())}'
+    return ContentFile(buffer.getvalue(), name=name), image.width, image.height
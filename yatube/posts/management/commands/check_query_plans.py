@@ -0,0 +1,140 @@
+import inspect
+import re
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import RequestFactory
+
+from posts import views
+from posts.models import Comment, Follow, Post
+from posts.utils import CURSOR_AFTER, encode_cursor
+
+# Полный проход по таблице без индекса и сортировка всей выборки
+# во временном B-дереве. «FOR RIGHT PART OF ORDER BY» не отмечается:
+# так досортировываются только строки с равным началом ключа.
+PROBLEM_RE = re.compile(
+    r'^SCAN (TABLE )?\w+$|USE TEMP B-TREE FOR (ORDER|GROUP) BY'
+)
+# Ожидаемые отметки: view, где без них не обойтись, и причина.
+EXPECTED = {
+    'posts:search': 'ранжирование сортирует все найденные посты',
+}
+
+
+class QueryCollector:
+    """execute_wrapper, запоминающий SELECT-запросы с параметрами."""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        if sql.lstrip().upper().startswith('SELECT'):
+            self.queries.append((sql, params))
+        return execute(sql, params, many, context)
+
+
+class Command(BaseCommand):
+    help = (
+        'Выполняет view приложения posts на данных базы и показывает '
+        'EXPLAIN QUERY PLAN их запросов, отмечая полные проходы по '
+        'таблицам и сортировки без индекса.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--analyze',
+            action='store_true',
+            help='Обновить статистику планировщика (ANALYZE) '
+                 'перед проверкой.',
+        )
+
+    def probes(self):
+        """Пары (название, view, аргументы, пользователь, GET-параметры)."""
+        post = (
+            Post.objects.filter(group__isnull=False).first()
+            or Post.objects.first()
+        )
+        if post is None:
+            raise CommandError('В базе нет постов для проверки')
+        follow = Follow.objects.select_related('user').first()
+        reader = follow.user if follow else post.author
+        comment = Comment.objects.first()
+        commented_id = comment.post_id if comment else post.pk
+        word = post.text.split()[0] if post.text.split() else 'пост'
+        anonymous = AnonymousUser()
+        feeds = [
+            ('posts:index', views.index, {}, anonymous),
+            (
+                'posts:profile',
+                views.profile,
+                {'username': post.author.username},
+                anonymous,
+            ),
+            ('posts:follow_index', views.follow_index, {}, reader),
+        ]
+        if post.group is not None:
+            feeds.append((
+                'posts:group_list',
+                views.group_posts,
+                {'slug': post.group.slug},
+                anonymous,
+            ))
+        # Ленты проверяются и с первой страницы, и с курсора.
+        cursor = {'cursor': encode_cursor(CURSOR_AFTER, post)}
+        probes = []
+        for name, view, kwargs, user in feeds:
+            probes.append((name, view, kwargs, user, {}))
+            probes.append((f'{name}?cursor', view, kwargs, user, cursor))
+        probes += [
+            (
+                'posts:post_detail',
+                views.post_detail,
+                {'post_id': commented_id},
+                anonymous,
+                {},
+            ),
+            ('posts:search', views.search, {}, anonymous, {'q': word}),
+        ]
+        return probes
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError(
+                'EXPLAIN QUERY PLAN поддерживает только SQLite'
+            )
+        if options['analyze']:
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+        factory = RequestFactory()
+        problems = 0
+        for name, view, kwargs, user, params in self.probes():
+            request = factory.get('/', params)
+            request.user = user
+            collector = QueryCollector()
+            # Проверяются сами запросы view, без кэша страниц и проверки
+            # авторизации.
+            view = inspect.unwrap(view)
+            with connection.execute_wrapper(collector):
+                view(request, **kwargs)
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            if name in EXPECTED:
+                self.stdout.write(f'  допустимо: {EXPECTED[name]}')
+            for sql, sql_params in collector.queries:
+                with connection.cursor() as cursor:
+                    cursor.execute(f'EXPLAIN QUERY PLAN {sql}', sql_params)
+                    plan = [row[-1] for row in cursor.fetchall()]
+                flagged = [step for step in plan if PROBLEM_RE.search(step)]
+                style = str
+                if flagged and name not in EXPECTED:
+                    problems += len(flagged)
+                    style = self.style.ERROR
+                if options['verbosity'] < 2:
+                    sql = sql[:120]
+                self.stdout.write(style(f'  {sql}'))
+                for step in plan:
+                    mark = '!' if step in flagged else ' '
+                    self.stdout.write(style(f'    {mark} {step}'))
+        if problems:
+            raise CommandError(f'Подозрительных шагов в планах: {problems}')
+        self.stdout.write(self.style.SUCCESS('Все запросы идут по индексам'))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import Post
+from posts.thumbnails import generate_thumbnails, is_stale
+
+
+class Command(BaseCommand):
+    help = 'Строит недостающие миниатюры картинок постов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Перестроить миниатюры всех постов с картинками.',
+        )
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image='').only(
+            'pk', 'image', 'thumbnails'
+        )
+        built = 0
+        for post in posts.iterator():
+            if options['all'] or is_stale(post):
+                generate_thumbnails(post.pk)
+                built += 1
+        self.stdout.write(
+            self.style.SUCCESS(f'Построены миниатюры постов: {built}')
+        )
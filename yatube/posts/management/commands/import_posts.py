@@ -0,0 +1,64 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import transfer
+
+
+class Command(BaseCommand):
+    help = 'Импортирует посты из файла NDJSON или CSV.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', help='Файл с постами, «-» - стандартный ввод.'
+        )
+        parser.add_argument(
+            '--format',
+            choices=transfer.FORMATS,
+            help='Формат файла; по умолчанию определяется по расширению.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=transfer.DEFAULT_BATCH_SIZE,
+            help='Постов в одной транзакции.',
+        )
+        parser.add_argument(
+            '--create-missing',
+            action='store_true',
+            help='Создавать отсутствующих авторов и группы.',
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or transfer.guess_format(path)
+        importer = transfer.PostImporter(
+            options['batch_size'], options['create_missing']
+        )
+        started = time.monotonic()
+
+        def progress(imported):
+            rate = imported / max(time.monotonic() - started, 1e-6)
+            self.stdout.write(
+                f'Импортировано постов: {imported} ({rate:.0f} строк/с)'
+            )
+
+        stream = (
+            sys.stdin if path == '-'
+            else open(path, encoding='utf-8', newline='')
+        )
+        try:
+            imported = importer.run(transfer.read_rows(stream, fmt), progress)
+        except ValueError as error:
+            raise CommandError(
+                f'{error}. Импортировано постов: {importer.imported}'
+            )
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово: {imported} постов за '
+            f'{time.monotonic() - started:.1f} с. Миниатюры картинок '
+            f'строит команда generate_thumbnails.'
+        ))
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from posts import counters
+
+
+class Command(BaseCommand):
+    help = (
+        'Сверяет счётчики постов, комментариев и подписок с данными '
+        'и исправляет расхождения.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только показать расхождения, завершиться с ошибкой, '
+                 'если они есть.',
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            user_drift = counters.find_user_stats_drift()
+            post_drift = counters.find_comments_count_drift()
+            for user_id, fields in user_drift.items():
+                for field, (saved, actual) in fields.items():
+                    self.stdout.write(
+                        f'user {user_id}: {field} {saved} -> {actual}'
+                    )
+            for post_id, (saved, actual) in post_drift.items():
+                self.stdout.write(
+                    f'post {post_id}: comments_count {saved} -> {actual}'
+                )
+            total = len(user_drift) + len(post_drift)
+            if options['check']:
+                if total:
+                    raise CommandError(f'Расхождений в счётчиках: {total}')
+                self.stdout.write(self.style.SUCCESS('Расхождений нет'))
+                return
+            counters.fix_user_stats(user_drift)
+            counters.fix_comments_count(post_drift)
+        self.stdout.write(self.style.SUCCESS(f'Исправлено записей: {total}'))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import Post
+from posts.search import get_backend, rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает поисковый индекс всех постов.'
+
+    def handle(self, *args, **options):
+        rebuild_index()
+        self.stdout.write(self.style.SUCCESS(
+            f'Проиндексировано постов: {Post.objects.count()} '
+            f'({type(get_backend()).__name__})'
+        ))
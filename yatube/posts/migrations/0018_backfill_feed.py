@@ -0,0 +1,35 @@
+from django.conf import settings
+from django.db import migrations
+
+
+def backfill_feed(apps, schema_editor):
+    Follow = apps.get_model('posts', 'Follow')
+    Post = apps.get_model('posts', 'Post')
+    FeedEntry = apps.get_model('posts', 'FeedEntry')
+    for follow in Follow.objects.iterator():
+        posts = Post.objects.filter(author_id=follow.author_id).order_by(
+            '-pub_date'
+        ).values_list('pk', 'pub_date')[:settings.FEED_BACKFILL_LIMIT]
+        FeedEntry.objects.bulk_create(
+            (
+                FeedEntry(
+                    user_id=follow.user_id,
+                    post_id=post_id,
+                    author_id=follow.author_id,
+                    pub_date=pub_date,
+                ) for post_id, pub_date in posts
+            ),
+            batch_size=settings.FEED_BATCH_SIZE,
+            ignore_conflicts=True,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0017_feedentry'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_feed, migrations.RunPython.noop),
+    ]
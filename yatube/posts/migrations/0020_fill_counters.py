@@ -0,0 +1,43 @@
+from django.conf import settings
+from django.db import migrations
+from django.db.models import Count, OuterRef, Subquery
+
+
+def fill_counters(apps, schema_editor):
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+    UserStats = apps.get_model('posts', 'UserStats')
+    users = User.objects.annotate(
+        actual_posts=Count('posts', distinct=True),
+        actual_followers=Count('following', distinct=True),
+        actual_following=Count('follower', distinct=True),
+    )
+    UserStats.objects.bulk_create(
+        (
+            UserStats(
+                user_id=user.pk,
+                posts_count=user.actual_posts,
+                followers_count=user.actual_followers,
+                following_count=user.actual_following,
+            ) for user in users.iterator()
+        ),
+        batch_size=1000,
+    )
+    comments = Comment.objects.filter(post=OuterRef('pk')).order_by().values(
+        'post'
+    ).annotate(total=Count('pk')).values('total')
+    Post.objects.filter(comments__isnull=False).update(
+        comments_count=Subquery(comments)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0019_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.16 on 2026-10-17 17:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0020_fill_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='thumbnails',
+            field=models.TextField(blank=True, editable=False, help_text='JSON: исходный файл и URL миниатюр по размерам', verbose_name='Миниатюры картинки'),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 2.2.16 on 2026-10-17 17:24
+
+from django.db import OperationalError, migrations, models
+import django.db.models.deletion
+
+
+def create_fts_table(apps, schema_editor):
+    # FTS5 есть не в каждой сборке SQLite, без неё поиск работает
+    # по встроенному инвертированному индексу.
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    try:
+        schema_editor.execute(
+            'CREATE VIRTUAL TABLE posts_search_fts USING fts5('
+            'text, grp, comments, '
+            "tokenize = 'unicode61 remove_diacritics 0')"
+        )
+    except OperationalError:
+        pass
+
+
+def drop_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS posts_search_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0021_post_thumbnails'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchTerm',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64, verbose_name='Основа слова')),
+                ('weight', models.FloatField(verbose_name='Вес слова в посте')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to='posts.Post', verbose_name='Пост')),
+            ],
+            options={
+                'verbose_name': 'Слово поискового индекса',
+                'verbose_name_plural': 'Слова поискового индекса',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='searchterm',
+            constraint=models.UniqueConstraint(fields=('term', 'post'), name='unique_search_term_post'),
+        ),
+        migrations.RunPython(create_fts_table, drop_fts_table),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 2.2.16 on 2026-10-17 19:05
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0023_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='updated',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now, help_text='Версия поста для ключей кэша его карточки', verbose_name='Дата изменения'),
+            preserve_default=False,
+        ),
+    ]
@@ -0,0 +1,56 @@
+from django.conf import settings
+from django.db import migrations
+from django.db.models import Count
+
+BATCH_SIZE = 1000
+STATS_FIELDS = ('posts_count', 'followers_count', 'following_count')
+
+
+def grouped_counts(queryset, field):
+    return dict(
+        queryset.order_by().values_list(field).annotate(total=Count('pk'))
+    )
+
+
+def recount_user_stats(apps, schema_editor):
+    """Пересчитывает счётчики, заполненные 0020_fill_counters, отдельными
+    группировками: общий JOIN трёх таблиц там размножал строки."""
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    Post = apps.get_model('posts', 'Post')
+    Follow = apps.get_model('posts', 'Follow')
+    UserStats = apps.get_model('posts', 'UserStats')
+    posts = grouped_counts(Post.objects.all(), 'author')
+    followers = grouped_counts(Follow.objects.all(), 'author')
+    following = grouped_counts(Follow.objects.all(), 'user')
+    stored = {
+        stats.user_id: stats for stats in UserStats.objects.iterator()
+    }
+    created, changed = [], []
+    for user_id in User.objects.values_list('pk', flat=True).iterator():
+        counts = (
+            posts.get(user_id, 0),
+            followers.get(user_id, 0),
+            following.get(user_id, 0),
+        )
+        stats = stored.get(user_id)
+        if stats is None:
+            created.append(UserStats(
+                user_id=user_id, **dict(zip(STATS_FIELDS, counts))
+            ))
+        elif tuple(getattr(stats, f) for f in STATS_FIELDS) != counts:
+            for field, count in zip(STATS_FIELDS, counts):
+                setattr(stats, field, count)
+            changed.append(stats)
+    UserStats.objects.bulk_create(created)
+    UserStats.objects.bulk_update(changed, STATS_FIELDS, batch_size=BATCH_SIZE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0026_post_image_storage'),
+    ]
+
+    operations = [
+        migrations.RunPython(recount_user_stats, migrations.RunPython.noop),
+    ]
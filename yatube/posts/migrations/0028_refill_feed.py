@@ -0,0 +1,53 @@
+from itertools import islice
+
+from django.conf import settings
+from django.db import migrations
+
+
+def refill_feed(apps, schema_editor):
+    """Раскладывает по лентам последние посты авторов, которые сейчас
+    не популярны: посты и подписки времени, когда автор был популярен,
+    в ленты не попали. Вставка идёт пачками по FEED_BATCH_SIZE объектов,
+    размер INSERT выбирает бэкенд БД."""
+    Follow = apps.get_model('posts', 'Follow')
+    Post = apps.get_model('posts', 'Post')
+    FeedEntry = apps.get_model('posts', 'FeedEntry')
+    UserStats = apps.get_model('posts', 'UserStats')
+    popular = UserStats.objects.filter(
+        followers_count__gt=settings.FEED_FANOUT_CAP
+    ).values('user_id')
+    authors = Follow.objects.exclude(author_id__in=popular).order_by(
+        'author_id'
+    ).values_list('author_id', flat=True).distinct()
+    for author_id in authors.iterator():
+        posts = list(Post.objects.filter(author_id=author_id).order_by(
+            '-pub_date'
+        ).values_list('pk', 'pub_date')[:settings.FEED_BACKFILL_LIMIT])
+        entries = (
+            FeedEntry(
+                user_id=user_id,
+                post_id=post_id,
+                author_id=author_id,
+                pub_date=pub_date,
+            )
+            for user_id in Follow.objects.filter(
+                author_id=author_id
+            ).values_list('user_id', flat=True).iterator()
+            for post_id, pub_date in posts
+        )
+        while True:
+            chunk = list(islice(entries, settings.FEED_BATCH_SIZE))
+            if not chunk:
+                break
+            FeedEntry.objects.bulk_create(chunk, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0027_recount_user_stats'),
+    ]
+
+    operations = [
+        migrations.RunPython(refill_feed, migrations.RunPython.noop),
+    ]
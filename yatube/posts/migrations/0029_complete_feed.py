@@ -0,0 +1,55 @@
+from itertools import islice
+
+from django.conf import settings
+from django.db import migrations
+
+
+def complete_feed(apps, schema_editor):
+    """Дописывает в ленты подписчиков посты авторов старше последних
+    FEED_BACKFILL_LIMIT: 0018_backfill_feed и 0028_refill_feed раскладывали
+    только их. Популярные авторы пропускаются, их посты читаются без
+    FeedEntry."""
+    Follow = apps.get_model('posts', 'Follow')
+    Post = apps.get_model('posts', 'Post')
+    FeedEntry = apps.get_model('posts', 'FeedEntry')
+    UserStats = apps.get_model('posts', 'UserStats')
+    popular = UserStats.objects.filter(
+        followers_count__gt=settings.FEED_FANOUT_CAP
+    ).values('user_id')
+    authors = Follow.objects.exclude(author_id__in=popular).order_by(
+        'author_id'
+    ).values_list('author_id', flat=True).distinct()
+    for author_id in authors.iterator():
+        posts = list(Post.objects.filter(author_id=author_id).order_by(
+            '-pub_date'
+        ).values_list('pk', 'pub_date')[settings.FEED_BACKFILL_LIMIT:])
+        if not posts:
+            continue
+        entries = (
+            FeedEntry(
+                user_id=user_id,
+                post_id=post_id,
+                author_id=author_id,
+                pub_date=pub_date,
+            )
+            for user_id in Follow.objects.filter(
+                author_id=author_id
+            ).values_list('user_id', flat=True).iterator()
+            for post_id, pub_date in posts
+        )
+        while True:
+            chunk = list(islice(entries, settings.FEED_BATCH_SIZE))
+            if not chunk:
+                break
+            FeedEntry.objects.bulk_create(chunk, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0028_refill_feed'),
+    ]
+
+    operations = [
+        migrations.RunPython(complete_feed, migrations.RunPython.noop),
+    ]
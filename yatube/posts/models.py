@@ -1,6 +1,11 @@
+import json
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.db import models
 
+from core.storage import ContentAddressedStorage
+
 User = get_user_model()
 
 
@@ -73,18 +78,101 @@ class Post(models.Model):
 
     image = models.ImageField(
         upload_to='posts/',
+        storage=ContentAddressedStorage(),
         blank=True,
         verbose_name='Картинка',
     )
+    image_width = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name='Ширина картинки',
+    )
+    image_height = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name='Высота картинки',
+    )
+    image_size = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name='Размер файла картинки, байт',
+    )
+    comments_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Количество комментариев',
+    )
+    thumbnails = models.TextField(
+        blank=True,
+        editable=False,
+        verbose_name='Миниатюры картинки',
+        help_text='JSON: исходный файл и URL миниатюр по размерам',
+    )
+    updated = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения',
+        help_text='Версия поста для ключей кэша его карточки',
+    )
 
     class Meta:
         ordering = ('-pub_date',)
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
+        # Ленты группы и профиля выбираются по индексу без сортировки.
+        indexes = [
+            models.Index(
+                name='post_author_pub_date_idx',
+                fields=['author', '-pub_date', '-id'],
+            ),
+            models.Index(
+                name='post_group_pub_date_idx',
+                fields=['group', '-pub_date', '-id'],
+            ),
+        ]
 
     def __str__(self):
         return self.text[:15]
 
+    @property
+    def thumbnail_urls(self):
+        """URL готовых миниатюр текущей картинки по именам размеров."""
+        try:
+            urls = json.loads(self.thumbnails)
+        except ValueError:
+            return {}
+        if urls.pop('source', None) != self.image.name:
+            return {}
+        return urls
+
+    @property
+    def thumbnail_url(self):
+        """Миниатюра для карточки поста; пока её нет - исходная картинка."""
+        return self.thumbnail_urls.get('card', self.image.url)
+
+    @property
+    def thumbnail_srcset(self):
+        """Варианты картинки карточки: [(MIME-тип, srcset), ...]."""
+        return [
+            (mime_type, ', '.join(f'{url} {width}w' for width, url in urls))
+            for mime_type, urls in self.thumbnail_urls.get(
+                'srcset', {}
+            ).items()
+            if urls
+        ]
+
+    @property
+    def thumbnail_dimensions(self):
+        """Ширина и высота картинки thumbnail_url, если они известны."""
+        if 'card' in self.thumbnail_urls:
+            geometry = settings.POST_THUMBNAIL_SIZES['card'][0]
+            return tuple(int(side) for side in geometry.split('x'))
+        if self.image_width and self.image_height:
+            return self.image_width, self.image_height
+        return None
+
 
 class Comment(models.Model):
     post = models.ForeignKey(
@@ -112,6 +200,12 @@ class Comment(models.Model):
         ordering = ('-created',)
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
+        indexes = [
+            models.Index(
+                name='comment_post_created_idx',
+                fields=['post', '-created', '-id'],
+            ),
+        ]
 
     def __str__(self):
         return self.text[:15]
@@ -141,3 +235,103 @@ class Follow(models.Model):
                 check=~models.Q(user=models.F('author')),
             ),
         ]
+
+
+class FeedEntry(models.Model):
+    """Запись материализованной ленты подписок пользователя."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Читатель',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Пост',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор поста',
+    )
+    pub_date = models.DateTimeField(
+        verbose_name='Дата публикации поста',
+    )
+
+    class Meta:
+        ordering = ('-pub_date',)
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        constraints = [
+            models.UniqueConstraint(
+                name='unique_feed_user_post',
+                fields=['user', 'post'],
+            ),
+        ]
+        indexes = [
+            models.Index(
+                name='feed_user_pub_date_idx',
+                fields=['user', '-pub_date', '-post'],
+            ),
+            models.Index(
+                name='feed_user_author_idx',
+                fields=['user', 'author'],
+            ),
+        ]
+
+
+class UserStats(models.Model):
+    """Счётчики пользователя, поддерживаемые при записи."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Пользователь',
+    )
+    posts_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Количество постов',
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Количество подписчиков',
+    )
+    following_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Количество подписок',
+    )
+
+    class Meta:
+        verbose_name = 'Счётчики пользователя'
+        verbose_name_plural = 'Счётчики пользователей'
+
+
+class SearchTerm(models.Model):
+    """Запись встроенного инвертированного индекса поиска по постам."""
+    term = models.CharField(
+        max_length=64,
+        verbose_name='Основа слова',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='search_terms',
+        verbose_name='Пост',
+    )
+    weight = models.FloatField(
+        verbose_name='Вес слова в посте',
+    )
+
+    class Meta:
+        verbose_name = 'Слово поискового индекса'
+        verbose_name_plural = 'Слова поискового индекса'
+        constraints = [
+            models.UniqueConstraint(
+                name='unique_search_term_post',
+                fields=['term', 'post'],
+            ),
+        ]
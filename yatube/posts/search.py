@@ -0,0 +1,277 @@
+"""Полнотекстовый поиск по постам.
+
+В поисковый документ поста входят его текст, название и описание группы
+и тексты комментариев. Слова приводятся к основе русским стеммером, так что
+«котики» находит «котиков». Если в SQLite есть FTS5, документы хранятся
+в таблице posts_search_fts и ранжируются по bm25, иначе - во встроенном
+инвертированном индексе SearchTerm с ранжированием по tf-idf.
+Между словами запроса действует «И». Индекс обновляют фоновые задачи,
+которые ставят в очередь сигналы.
+"""
+import math
+import re
+from collections import Counter, defaultdict
+from functools import lru_cache
+from itertools import chain, islice
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Case, Count, F, FloatField, Sum, When
+
+from core.tasks import task
+
+from .models import Comment, Post, SearchTerm
+from .stemmer import stem
+from .utils import bulk_create_chunked
+
+TOKEN_RE = re.compile(r'\w+')
+FTS_TABLE = 'posts_search_fts'
+# Вес совпадения в тексте поста, в группе и в комментариях.
+FIELD_WEIGHTS = {'text': 3.0, 'group': 2.0, 'comments': 1.0}
+INDEX_CHUNK_SIZE = 500
+MAX_TERM_LENGTH = 64
+# Строк в одном INSERT в FTS5: по 4 параметра, не больше 999 на запрос.
+FTS_INSERT_ROWS = 200
+# Словарь текстов невелик, поэтому основы слов запоминаются.
+cached_stem = lru_cache(maxsize=100000)(stem)
+
+
+def tokenize(text):
+    """Основы слов текста в порядке появления."""
+    return [
+        cached_stem(word)[:MAX_TERM_LENGTH]
+        for word in TOKEN_RE.findall(text.lower())
+    ]
+
+
+def query_terms(query):
+    return list(dict.fromkeys(tokenize(query)))
+
+
+def _documents(post_ids):
+    """Поля поисковых документов постов: {post_id: {поле: текст}}."""
+    documents = {}
+    posts = Post.objects.filter(pk__in=post_ids).order_by().values_list(
+        'pk', 'text', 'group__title', 'group__description'
+    )
+    for post_id, text, title, description in posts:
+        documents[post_id] = {
+            'text': text,
+            'group': f'{title} {description}' if title else '',
+            'comments': [],
+        }
+    comments = Comment.objects.filter(post_id__in=documents).values_list(
+        'post_id', 'text'
+    )
+    for post_id, text in comments.iterator():
+        documents[post_id]['comments'].append(text)
+    for fields in documents.values():
+        fields['comments'] = ' '.join(fields['comments'])
+    return documents
+
+
+class InvertedIndexBackend:
+    """Инвертированный индекс в таблице SearchTerm."""
+
+    def index(self, post_ids):
+        documents = _documents(post_ids)
+        SearchTerm.objects.filter(post_id__in=post_ids).delete()
+        bulk_create_chunked(
+            SearchTerm, self._terms(documents), INDEX_CHUNK_SIZE
+        )
+
+    def _terms(self, documents):
+        for post_id, fields in documents.items():
+            weights = defaultdict(float)
+            for field, text in fields.items():
+                for term, count in Counter(tokenize(text)).items():
+                    weights[term] += FIELD_WEIGHTS[field] * (
+                        1 + math.log(count)
+                    )
+            for term, weight in weights.items():
+                yield SearchTerm(term=term, post_id=post_id, weight=weight)
+
+    def remove(self, post_ids):
+        SearchTerm.objects.filter(post_id__in=post_ids).delete()
+
+    def clear(self):
+        SearchTerm.objects.all().delete()
+
+    def search(self, terms):
+        """id постов со всеми словами запроса, от лучших к худшим."""
+        frequencies = dict(
+            SearchTerm.objects.filter(term__in=terms).values('term').annotate(
+                posts=Count('id')
+            ).values_list('term', 'posts')
+        )
+        if len(frequencies) < len(terms):
+            return []
+        total = Post.objects.count()
+        score = Sum(Case(
+            *(
+                When(
+                    term=term,
+                    then=F('weight') * math.log(1 + total / posts),
+                )
+                for term, posts in frequencies.items()
+            ),
+            output_field=FloatField(),
+        ))
+        return SearchTerm.objects.filter(term__in=terms).values(
+            'post'
+        ).annotate(
+            matched=Count('id'), score=score
+        ).filter(
+            matched=len(terms)
+        ).order_by('-score', '-post').values_list('post', flat=True)
+
+
+class FtsResults:
+    """Ленивая выборка id найденных постов для Paginator."""
+
+    def __init__(self, match):
+        self.match = match
+
+    def count(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT COUNT(*) FROM {FTS_TABLE} '
+                f'WHERE {FTS_TABLE} MATCH %s',
+                [self.match],
+            )
+            return cursor.fetchone()[0]
+
+    def __getitem__(self, item):
+        if not isinstance(item, slice):
+            return self[item:item + 1][0]
+        start = item.start or 0
+        limit = -1 if item.stop is None else max(item.stop - start, 0)
+        weights = ', '.join(map(str, FIELD_WEIGHTS.values()))
+        with connection.cursor() as cursor:
+            # bm25 меньше у более подходящих документов.
+            cursor.execute(
+                f'SELECT rowid FROM {FTS_TABLE} '
+                f'WHERE {FTS_TABLE} MATCH %s '
+                f'ORDER BY bm25({FTS_TABLE}, {weights}), rowid DESC '
+                f'LIMIT %s OFFSET %s',
+                [self.match, limit, start],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def __len__(self):
+        return self.count()
+
+
+class Fts5Backend:
+    """Таблица SQLite FTS5 со стеммированными документами постов."""
+
+    def index(self, post_ids):
+        documents = _documents(post_ids)
+        self.remove(post_ids)
+        rows = [
+            [post_id] + [
+                ' '.join(tokenize(fields[field])) for field in FIELD_WEIGHTS
+            ]
+            for post_id, fields in documents.items()
+        ]
+        # Многострочный INSERT вместо executemany: его не умеет
+        # записывать панель SQL debug toolbar на SQLite.
+        with connection.cursor() as cursor:
+            for start in range(0, len(rows), FTS_INSERT_ROWS):
+                chunk = rows[start:start + FTS_INSERT_ROWS]
+                cursor.execute(
+                    f'INSERT INTO {FTS_TABLE} (rowid, text, grp, comments) '
+                    f'VALUES {", ".join(["(%s, %s, %s, %s)"] * len(chunk))}',
+                    list(chain.from_iterable(chunk)),
+                )
+
+    def remove(self, post_ids):
+        post_ids = list(post_ids)
+        if not post_ids:
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid IN '
+                f'({", ".join(["%s"] * len(post_ids))})',
+                post_ids,
+            )
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+
+    def search(self, terms):
+        # Основы берутся в кавычки, чтобы не стать операторами FTS5.
+        match = ' '.join('"{}"'.format(term.replace('"', '""'))
+                         for term in terms)
+        return FtsResults(match)
+
+
+@lru_cache(maxsize=None)
+def fts5_available():
+    return (
+        connection.vendor == 'sqlite'
+        and FTS_TABLE in connection.introspection.table_names()
+    )
+
+
+def get_backend():
+    name = settings.SEARCH_BACKEND
+    if name == 'auto':
+        name = 'fts5' if fts5_available() else 'index'
+    if name == 'fts5':
+        return Fts5Backend()
+    return InvertedIndexBackend()
+
+
+@task
+def index_posts(post_ids):
+    """Переиндексирует посты пачками по INDEX_CHUNK_SIZE."""
+    backend = get_backend()
+    post_ids = iter(post_ids)
+    while True:
+        chunk = list(islice(post_ids, INDEX_CHUNK_SIZE))
+        if not chunk:
+            return
+        backend.index(chunk)
+
+
+@task
+def remove_posts(post_ids):
+    get_backend().remove(post_ids)
+
+
+def rebuild_index():
+    backend = get_backend()
+    backend.clear()
+    index_posts(list(Post.objects.values_list('pk', flat=True)))
+
+
+def _schedule(job, post_ids):
+    post_ids = iter(post_ids)
+    while True:
+        chunk = list(islice(post_ids, INDEX_CHUNK_SIZE))
+        if not chunk:
+            return
+        # Задачи по одному посту схлопываются, пока ждут в очереди.
+        job.enqueue(chunk, key=chunk[0] if len(chunk) == 1 else None)
+
+
+def schedule_index(post_ids):
+    """Ставит переиндексацию постов в очередь фоновых задач."""
+    _schedule(index_posts, post_ids)
+
+
+def schedule_remove(post_ids):
+    _schedule(remove_posts, post_ids)
+
+
+def search(query):
+    """Упорядоченные по релевантности id постов, подходящих под запрос.
+
+    Результат поддерживает count() и срезы, его можно отдать Paginator.
+    """
+    terms = query_terms(query)
+    if not terms:
+        return []
+    return get_backend().search(terms)
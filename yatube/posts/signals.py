@@ -0,0 +1,174 @@
+from django.db.models.signals import (post_delete, post_init, post_save,
+                                      pre_delete, pre_save)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from core import media
+
+from . import counters, feed, search, thumbnails
+from .caching import (bump_generation, group_feed, index_feed, post_feeds,
+                      profile_feed)
+from .models import Comment, Follow, Group, Post
+
+# Обработчики вызываются в порядке регистрации: счётчики обновляются
+# раньше ленты, которая по ним определяет популярных авторов.
+
+
+@receiver(post_save, sender=Post)
+def count_new_post(sender, instance, created, **kwargs):
+    if created:
+        counters.change_user_stats(instance.author_id, posts_count=1)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    counters.change_user_stats(instance.author_id, posts_count=-1)
+
+
+@receiver(post_save, sender=Comment)
+def count_new_comment(sender, instance, created, **kwargs):
+    if created:
+        counters.change_comments_count(instance.post_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    counters.change_comments_count(instance.post_id, -1)
+
+
+@receiver(post_save, sender=Follow)
+def count_new_follow(sender, instance, created, **kwargs):
+    if created:
+        counters.change_user_stats(instance.author_id, followers_count=1)
+        counters.change_user_stats(instance.user_id, following_count=1)
+
+
+@receiver(post_delete, sender=Follow)
+def count_deleted_follow(sender, instance, **kwargs):
+    counters.change_user_stats(instance.author_id, followers_count=-1)
+    counters.change_user_stats(instance.user_id, following_count=-1)
+
+
+@receiver(post_save, sender=Post)
+def fan_out_new_post(sender, instance, created, **kwargs):
+    if created:
+        feed.fan_out_post(instance)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_feed(sender, instance, created, **kwargs):
+    if created:
+        feed.backfill(instance.user, instance.author)
+
+
+@receiver(post_delete, sender=Follow)
+def prune_feed(sender, instance, **kwargs):
+    feed.prune(instance.user, instance.author)
+    feed.schedule_refill(instance.author_id)
+
+
+@receiver(pre_save, sender=Post)
+def invalidate_previous_group(sender, instance, **kwargs):
+    if instance.pk is None:
+        return
+    previous_slug = Post.objects.filter(pk=instance.pk).values_list(
+        'group__slug', flat=True
+    ).first()
+    if previous_slug is not None:
+        bump_generation(group_feed(previous_slug))
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post_feeds(sender, instance, **kwargs):
+    bump_generation(*post_feeds(instance))
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comment_feeds(sender, instance, **kwargs):
+    bump_generation(*post_feeds(instance.post))
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_group_feeds(sender, instance, **kwargs):
+    bump_generation(index_feed(), group_feed(instance.slug))
+
+
+@receiver(post_save, sender=Group)
+@receiver(pre_delete, sender=Group)
+def refresh_group_post_cards(sender, instance, created=False, **kwargs):
+    # В карточках постов есть ссылка на группу, а update() и SET_NULL
+    # не меняют Post.updated сами.
+    if not created:
+        instance.posts.update(updated=timezone.now())
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_profile_feed(sender, instance, **kwargs):
+    bump_generation(profile_feed(instance.author.username))
+
+
+@receiver(post_save, sender=Post)
+def refresh_thumbnails(sender, instance, **kwargs):
+    if instance.image and thumbnails.is_stale(instance):
+        thumbnails.generate_thumbnails.enqueue(
+            instance.pk, key=instance.pk
+        )
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, **kwargs):
+    search.schedule_index([instance.pk])
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post(sender, instance, **kwargs):
+    search.schedule_remove([instance.pk])
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def index_commented_post(sender, instance, **kwargs):
+    search.schedule_index([instance.post_id])
+
+
+@receiver(post_save, sender=Group)
+def index_group_posts(sender, instance, created, **kwargs):
+    if not created:
+        search.schedule_index(
+            instance.posts.values_list('pk', flat=True)
+        )
+
+
+@receiver(pre_delete, sender=Group)
+def index_ungrouped_posts(sender, instance, **kwargs):
+    # После удаления группы у постов обнуляется group, а вместе
+    # с ней из документов пропадают название и описание группы.
+    search.schedule_index(instance.posts.values_list('pk', flat=True))
+
+
+@receiver(post_init, sender=Post)
+def remember_image(sender, instance, **kwargs):
+    # Имя картинки при загрузке из базы; у отложенного поля - None.
+    image = instance.__dict__.get('image')
+    instance._stored_image = getattr(image, 'name', image)
+
+
+@receiver(post_save, sender=Post)
+def count_image_references(sender, instance, created, **kwargs):
+    previous = '' if created else instance._stored_image
+    if previous is None:
+        return
+    current = instance.image.name or ''
+    if previous != current:
+        media.add_reference(current)
+        media.release(previous)
+    instance._stored_image = current
+
+
+@receiver(post_delete, sender=Post)
+def release_image(sender, instance, **kwargs):
+    media.release(instance.image.name)
@@ -0,0 +1,15 @@
+from django import template
+
+from ..caching import render_post_cards
+
+register = template.Library()
+
+
+@register.simple_tag
+def post_cards(posts, **options):
+    """Список карточек постов из кэша фрагментов.
+
+    Флаги author_link, detail_link и group_link добавляют в карточку
+    ссылки на профиль автора, страницу поста и группу.
+    """
+    return render_post_cards(posts, **options)
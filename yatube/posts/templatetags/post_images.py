@@ -0,0 +1,25 @@
+from django import template
+
+register = template.Library()
+
+# Ширина карточки в ленте: колонка .container на брейкпоинтах Bootstrap.
+CARD_SIZES = (
+    '(min-width: 1200px) 1110px, (min-width: 992px) 930px, '
+    '(min-width: 768px) 690px, (min-width: 576px) 510px, 100vw'
+)
+
+
+@register.inclusion_tag('posts/includes/post_image.html')
+def post_image(post, sizes=CARD_SIZES):
+    """Картинка поста в <picture> с srcset готовых вариантов.
+
+    URL вариантов лежат в Post.thumbnails и приходят вместе с постами,
+    поэтому тег не обращается ни к базе, ни к хранилищу. sizes - ширина
+    картинки в вёрстке страницы для атрибута sizes.
+    """
+    return {
+        'post': post,
+        'sources': post.thumbnail_srcset,
+        'sizes': sizes,
+        'dimensions': post.thumbnail_dimensions,
+    }
@@ -1,12 +1,15 @@
 import shutil
 import tempfile
+from io import BytesIO
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from PIL import Image
 
+from ..forms import PostForm
 from ..models import Comment, Group, Post
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
@@ -19,6 +22,8 @@ SMALL_GIF = (
     b'\x0A\x00\x3B'
 )
 User = get_user_model()
+# Картинки хранятся под именами по содержимому.
+HASHED_WEBP = r'^posts/[0-9a-f]{2}/[0-9a-f]{32}\.webp$'
 
 
 @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
@@ -99,7 +104,7 @@ class PostFormTest(TestCase):
                 text=PostFormTest.post_form_data['create']['text'],
                 author=PostFormTest.author,
                 group=PostFormTest.post_form_data['create']['group'],
-                image='posts/create_small.gif',
+                image__regex=HASHED_WEBP,
             ).exists()
         )
 
@@ -118,7 +123,7 @@ class PostFormTest(TestCase):
                 text=PostFormTest.post_form_data['author_edit']['text'],
                 author=PostFormTest.author,
                 group=PostFormTest.post_form_data['author_edit']['group'],
-                image='posts/edit_small.gif',
+                image__regex=HASHED_WEBP,
             ).exists()
         )
 
@@ -158,3 +163,52 @@ class PostFormTest(TestCase):
                 text=PostFormTest.comment_form_data['text'],
             ).exists()
         )
+
+    @override_settings(POST_IMAGE_MAX_SIDE=100)
+    def test_uploaded_image_is_bounded_and_stripped(self):
+        """Картинка поворачивается по EXIF, уменьшается, теряет EXIF
+        и сохраняет свои размеры в посте."""
+        exif = Image.Exif()
+        exif[0x0112] = 6  # повернуть на 90° по часовой стрелке
+        exif[0x010F] = 'Camera'
+        source = BytesIO()
+        Image.new('RGB', (400, 200), 'red').save(
+            source, 'JPEG', exif=exif.tobytes()
+        )
+        form = PostForm(
+            data={'text': 'Фото'},
+            files={'image': SimpleUploadedFile(
+                'photo.jpg', source.getvalue(), 'image/jpeg'
+            )},
+        )
+        self.assertTrue(form.is_valid(), form.errors)
+        post = form.save(commit=False)
+        post.author = PostFormTest.author
+        post.save()
+        post.refresh_from_db()
+        self.assertRegex(post.image.name, HASHED_WEBP)
+        self.assertEqual((post.image_width, post.image_height), (50, 100))
+        self.assertEqual(post.image_size, post.image.size)
+        with Image.open(post.image) as stored:
+            self.assertEqual(stored.format, 'WEBP')
+            self.assertEqual(stored.size, (50, 100))
+            self.assertNotIn('exif', stored.info)
+
+    def test_clearing_image_resets_dimensions(self):
+        post = Post.objects.create(
+            text='С картинкой',
+            author=PostFormTest.author,
+            image='posts/old.webp',
+            image_width=10,
+            image_height=10,
+            image_size=100,
+        )
+        form = PostForm(
+            data={'text': 'Без картинки', 'image-clear': 'on'}, instance=post
+        )
+        self.assertTrue(form.is_valid(), form.errors)
+        form.save()
+        post.refresh_from_db()
+        self.assertEqual(post.image, '')
+        self.assertIsNone(post.image_width)
+        self.assertIsNone(post.image_size)
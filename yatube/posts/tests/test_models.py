@@ -1,7 +1,19 @@
+import json
+import os
+import shutil
+import tempfile
+from datetime import datetime, timezone
+from io import StringIO
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.test import TestCase, override_settings
+
+from core.models import StoredFile
 
-from ..models import Group, Post
+from ..models import Comment, FeedEntry, Follow, Group, Post, UserStats
 
 User = get_user_model()
 
@@ -118,3 +130,151 @@ class PostModelTest(TestCase):
                     post._meta.get_field(field['field_name']).help_text,
                     field['help_text']
                 )
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='Author')
+        cls.reader = User.objects.create(username='Reader')
+
+    def stats(self, user):
+        return UserStats.objects.get(user=user)
+
+    def test_counters_follow_writes(self):
+        """Счётчики меняются при создании и удалении постов, комментариев
+        и подписок.
+        """
+        post = Post.objects.create(text='Пост', author=CountersTest.author)
+        comment = Comment.objects.create(
+            text='Комментарий', post=post, author=CountersTest.reader
+        )
+        follow = Follow.objects.create(
+            user=CountersTest.reader, author=CountersTest.author
+        )
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(self.stats(CountersTest.author).posts_count, 1)
+        self.assertEqual(self.stats(CountersTest.author).followers_count, 1)
+        self.assertEqual(self.stats(CountersTest.reader).following_count, 1)
+        comment.delete()
+        follow.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+        self.assertEqual(self.stats(CountersTest.author).followers_count, 0)
+        self.assertEqual(self.stats(CountersTest.reader).following_count, 0)
+        post.delete()
+        self.assertEqual(self.stats(CountersTest.author).posts_count, 0)
+
+    def test_rebuild_counters_fixes_drift(self):
+        """rebuild_counters находит и исправляет расхождения."""
+        post = Post.objects.create(text='Пост', author=CountersTest.author)
+        Post.objects.filter(pk=post.pk).update(comments_count=5)
+        UserStats.objects.filter(user=CountersTest.author).update(
+            posts_count=7
+        )
+        with self.assertRaises(CommandError):
+            call_command('rebuild_counters', check=True, stdout=StringIO())
+        call_command('rebuild_counters', stdout=StringIO())
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+        self.assertEqual(self.stats(CountersTest.author).posts_count, 1)
+        call_command('rebuild_counters', check=True, stdout=StringIO())
+
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class TransferCommandsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='Author')
+        cls.reader = User.objects.create(username='Reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        super().setUp()
+        self.path = os.path.join(TEMP_MEDIA_ROOT, 'posts.ndjson')
+
+    def write(self, rows, path=None):
+        with open(path or self.path, 'w', encoding='utf-8') as stream:
+            for row in rows:
+                stream.write(json.dumps(row, ensure_ascii=False) + '\n')
+
+    def test_export_import_round_trip_with_images(self):
+        """Выгруженные посты с картинками загружаются обратно без потерь."""
+        post = Post.objects.create(
+            text='Пост с картинкой',
+            author=TransferCommandsTest.author,
+            group=TransferCommandsTest.group,
+            image=SimpleUploadedFile('small.gif', b'GIF89a', 'image/gif'),
+        )
+        pub_date = post.pub_date
+        image_name = post.image.name
+        for fmt, name in (('ndjson', 'posts.ndjson'), ('csv', 'posts.csv')):
+            with self.subTest(format=fmt):
+                path = os.path.join(TEMP_MEDIA_ROOT, name)
+                call_command(
+                    'export_posts', path, with_images=True, stderr=StringIO()
+                )
+                Post.objects.all().delete()
+                call_command(
+                    'import_posts', path, batch_size=1, stdout=StringIO()
+                )
+                post = Post.objects.get()
+                self.assertEqual(post.text, 'Пост с картинкой')
+                self.assertEqual(post.pub_date, pub_date)
+                self.assertEqual(post.group, TransferCommandsTest.group)
+                self.assertEqual(post.image.read(), b'GIF89a')
+                # Картинка ложится в тот же файл по содержимому,
+                # и ссылка на него учтена.
+                self.assertEqual(post.image.name, image_name)
+                self.assertEqual(
+                    StoredFile.objects.get(name=image_name).refs, 1
+                )
+
+    def test_import_updates_counters_and_feeds(self):
+        self.write(
+            {
+                'author': 'Author',
+                'text': f'Пост {i}',
+                'pub_date': f'2020-01-0{i}T12:00:00+00:00',
+            }
+            for i in range(1, 4)
+        )
+        out = StringIO()
+        call_command('import_posts', self.path, batch_size=2, stdout=out)
+        self.assertIn('строк/с', out.getvalue())
+        self.assertEqual(
+            list(Post.objects.values_list('pub_date', flat=True))[-1],
+            datetime(2020, 1, 1, 12, tzinfo=timezone.utc),
+        )
+        self.assertEqual(
+            FeedEntry.objects.filter(user=TransferCommandsTest.reader).count(),
+            3,
+        )
+        call_command('rebuild_counters', check=True, stdout=StringIO())
+
+    def test_import_unknown_author(self):
+        rows = [
+            {'author': 'Author', 'text': 'Первый'},
+            {'author': 'Newcomer', 'group': 'new-group', 'text': 'Второй'},
+        ]
+        self.write(rows)
+        with self.assertRaisesMessage(CommandError, 'Запись 2'):
+            call_command('import_posts', self.path, stdout=StringIO())
+        self.assertFalse(Post.objects.exists())
+        call_command(
+            'import_posts', self.path, create_missing=True, stdout=StringIO()
+        )
+        post = Post.objects.get(author__username='Newcomer')
+        self.assertEqual(post.group.slug, 'new-group')
@@ -1,16 +1,27 @@
+import json
 import shutil
 import tempfile
+import zipfile
+from io import BytesIO, StringIO
+from unittest import mock
 
 from django import forms
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.template.loader import render_to_string
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from PIL import Image
+
+from core.tasks import run_pending
 
 from ..forms import PostForm
-from ..models import Follow, Group, Post
+from ..models import Comment, FeedEntry, Follow, Group, Post
+from ..thumbnails import generate_thumbnails
+from .utils import assert_query_budget
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 SMALL_GIF = (
@@ -81,6 +92,7 @@ class PostViewTests(TestCase):
             cls.post_detail_url: 'posts/post_detail.html',
             reverse('posts:create_post'): 'posts/create_post.html',
             cls.post_edit_url: 'posts/create_post.html',
+            reverse('posts:search'): 'posts/search.html',
         }
         cls.context_specs = {
             'author': {
@@ -124,19 +136,245 @@ class PostViewTests(TestCase):
                 self.assertTemplateUsed(response, template)
 
     def test_home_page_use_caching(self):
-        """Кэширование корректно работает на главной странице."""
+        """Главная страница отдаётся из кэша, пока лента не изменилась."""
+        response = PostViewTests.author_client.get(reverse('posts:index'))
+        self.assertIsNotNone(response.context)
         response = PostViewTests.author_client.get(reverse('posts:index'))
-        content_before_change = response.content
+        self.assertIsNone(response.context)
+
+    def test_new_post_invalidates_cached_feeds(self):
+        """Новый пост сразу появляется на закэшированных страницах лент."""
+        for url in (
+            reverse('posts:index'),
+            PostViewTests.group_url,
+            PostViewTests.profile_url,
+        ):
+            with self.subTest(url=url):
+                PostViewTests.author_client.get(url)
+                new_post = Post.objects.create(
+                    text=f'Новый пост для {url}',
+                    author=PostViewTests.author,
+                    group=PostViewTests.group,
+                )
+                response = PostViewTests.author_client.get(url)
+                self.assertContains(response, new_post.text)
+                new_post.delete()
+
+    def test_stale_page_served_while_another_worker_rebuilds(self):
+        """Пока страницу перестраивает другой запрос, отдаётся старая
+        версия.
+        """
+        url = reverse('posts:index')
+        content_before_change = PostViewTests.author_client.get(url).content
         Post.objects.create(
-            text='Данный пост не отобразится сразу после кэширования',
+            text='Данный пост появится после перестроения страницы',
             author=PostViewTests.author,
         )
-        response = PostViewTests.author_client.get(reverse('posts:index'))
+        with mock.patch(
+            'posts.caching.acquire_rebuild_lock', return_value=False
+        ):
+            response = PostViewTests.author_client.get(url)
         self.assertEqual(response.content, content_before_change)
-        cache.clear()
-        response = PostViewTests.author_client.get(reverse('posts:index'))
+        response = PostViewTests.author_client.get(url)
         self.assertNotEqual(response.content, content_before_change)
 
+    def test_unchanged_feeds_answer_not_modified(self):
+        """Неизменившаяся лента отдаёт 304 без запросов к базе, новый пост
+        меняет ETag и Last-Modified.
+        """
+        for url in (
+            reverse('posts:index'),
+            PostViewTests.group_url,
+            PostViewTests.profile_url,
+        ):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                etag = response['ETag']
+                self.assertTrue(response.has_header('Last-Modified'))
+                with self.assertNumQueries(0):
+                    response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+                # Страница одна на всех посетителей.
+                response = PostViewTests.author_client.get(
+                    url, HTTP_IF_NONE_MATCH=etag
+                )
+                self.assertEqual(response.status_code, 304)
+                new_post = Post.objects.create(
+                    text='Пост меняет ленту',
+                    author=PostViewTests.author,
+                    group=PostViewTests.group,
+                )
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertContains(response, new_post.text)
+                self.assertNotEqual(response['ETag'], etag)
+                new_post.delete()
+
+    def test_shared_pages_do_not_depend_on_user(self):
+        """Ленты и страница поста одинаковы для всех и кэшируются CDN."""
+        for url in (
+            reverse('posts:index'),
+            PostViewTests.group_url,
+            PostViewTests.profile_url,
+            PostViewTests.post_detail_url,
+        ):
+            with self.subTest(url=url):
+                cache.clear()
+                anonymous = self.client.get(url)
+                cache.clear()
+                author = PostViewTests.author_client.get(url)
+                self.assertEqual(anonymous.content, author.content)
+                self.assertNotIn('Cookie', author.get('Vary', ''))
+                self.assertIn('public', author['Cache-Control'])
+                self.assertNotIn('csrftoken', author.cookies)
+
+    def test_personal_data_served_separately(self):
+        """Данные пользователя отдаёт отдельный некэшируемый JSON."""
+        url = reverse('posts:personal')
+        data = self.client.get(url, {'author': 'TestUser'}).json()
+        self.assertFalse(data['authenticated'])
+        self.assertIs(data['following'], False)
+        response = PostViewTests.follower_client.get(
+            url, {'author': 'TestUser'}
+        )
+        self.assertIn('no-cache', response['Cache-Control'])
+        data = response.json()
+        self.assertTrue(data['authenticated'])
+        self.assertEqual(data['username'], 'Follower')
+        self.assertEqual(
+            data['profile_url'],
+            reverse('posts:profile', args=['Follower']),
+        )
+        self.assertTrue(data['csrf_token'])
+        self.assertIs(data['following'], False)
+        Follow.objects.create(
+            user=PostViewTests.follower, author=PostViewTests.author
+        )
+        data = PostViewTests.follower_client.get(
+            url, {'author': 'TestUser'}
+        ).json()
+        self.assertIs(data['following'], True)
+        data = PostViewTests.author_client.get(
+            url, {'author': 'TestUser'}
+        ).json()
+        self.assertIsNone(data['following'])
+
+    def test_edit_rerenders_only_edited_card(self):
+        """После правки поста лента перестраивает только его карточку,
+        остальные берутся из кэша фрагментов.
+        """
+        Post.objects.create(text='Соседний пост', author=PostViewTests.author)
+        url = reverse('posts:index')
+        PostViewTests.author_client.get(url)
+        PostViewTests.author_client.post(
+            PostViewTests.post_edit_url,
+            {'text': 'Исправленный текст', 'group': PostViewTests.group.pk},
+        )
+        with mock.patch(
+            'posts.caching.render_to_string', wraps=render_to_string
+        ) as render:
+            response = PostViewTests.author_client.get(url)
+        self.assertContains(response, 'Исправленный текст')
+        self.assertContains(response, 'Соседний пост')
+        self.assertEqual(render.call_count, 1)
+        self.assertEqual(
+            render.call_args.args[1]['post'].pk, PostViewTests.post.pk
+        )
+
+    def test_pages_fit_query_budget(self):
+        """Страницы укладываются в бюджет SQL-запросов."""
+        Follow.objects.create(
+            user=PostViewTests.follower,
+            author=PostViewTests.author,
+        )
+        budgets = {
+            reverse('posts:index'): 4,
+            PostViewTests.group_url: 4,
+            PostViewTests.profile_url: 5,
+            PostViewTests.post_detail_url: 4,
+            reverse('posts:follow_index'): 4,
+            reverse('posts:create_post'): 3,
+            PostViewTests.post_edit_url: 4,
+        }
+        for url, budget in budgets.items():
+            with self.subTest(url=url):
+                with assert_query_budget(self, budget):
+                    PostViewTests.follower_client.get(url)
+        Follow.objects.get(
+            user=PostViewTests.follower,
+            author=PostViewTests.author,
+        ).delete()
+
+    def test_view_queries_use_indexes(self):
+        """Запросы страниц не сканируют таблицы и не сортируют выборки."""
+        call_command('check_query_plans', stdout=StringIO())
+
+    def test_post_detail_queries_do_not_depend_on_comments(self):
+        """Число запросов страницы поста не растёт с числом комментариев."""
+        PostViewTests.author_client.get(PostViewTests.post_detail_url)
+        with assert_query_budget(self, 100) as few_comments:
+            PostViewTests.author_client.get(PostViewTests.post_detail_url)
+        Comment.objects.bulk_create(
+            Comment(
+                post=PostViewTests.post,
+                author=User.objects.create(username=f'Commenter_{i}'),
+                text=f'Комментарий № {i}',
+            ) for i in range(30)
+        )
+        with assert_query_budget(self, len(few_comments)):
+            PostViewTests.author_client.get(PostViewTests.post_detail_url)
+
+    def test_pages_show_pregenerated_thumbnail(self):
+        """Страницы выводят заранее построенную миниатюру картинки."""
+        generate_thumbnails(PostViewTests.post.pk)
+        thumbnail_url = Post.objects.get(
+            pk=PostViewTests.post.pk
+        ).thumbnail_url
+        self.assertNotEqual(thumbnail_url, PostViewTests.post.image.url)
+        for url in (
+            reverse('posts:index'),
+            PostViewTests.group_url,
+            PostViewTests.profile_url,
+            PostViewTests.post_detail_url,
+        ):
+            with self.subTest(url=url):
+                with mock.patch('sorl.thumbnail.get_thumbnail') as sorl:
+                    response = PostViewTests.author_client.get(url)
+                sorl.assert_not_called()
+                self.assertContains(response, thumbnail_url)
+                self.assertContains(response, '<source type="image/webp"')
+                # Размеры заданы заранее, и вёрстка не прыгает.
+                self.assertContains(response, 'width="960" height="339"')
+        Post.objects.filter(pk=PostViewTests.post.pk).update(thumbnails='')
+
+    def test_thumbnail_srcset_variants(self):
+        """Варианты srcset строятся по ширинам и не больше картинки."""
+        source = BytesIO()
+        Image.new('RGB', (1000, 400), 'red').save(source, 'PNG')
+        post = Post.objects.create(
+            text='Широкая картинка',
+            author=PostViewTests.author,
+            image=SimpleUploadedFile('wide.png', source.getvalue()),
+        )
+        generate_thumbnails(post.pk)
+        post.refresh_from_db()
+        srcset = dict(post.thumbnail_srcset)
+        self.assertEqual(list(srcset), ['image/webp', 'image/jpeg'])
+        for mime_type, extension in (
+            ('image/webp', 'webp'),
+            ('image/jpeg', 'jpg'),
+        ):
+            with self.subTest(mime_type=mime_type):
+                candidates = srcset[mime_type].split(', ')
+                self.assertEqual(
+                    [candidate.split()[1] for candidate in candidates],
+                    ['320w', '640w', '960w', '1000w'],
+                )
+                for candidate in candidates:
+                    self.assertTrue(
+                        candidate.split()[0].endswith(f'.{extension}')
+                    )
+        post.delete()
+
     def test_group_list_show_correct_context(self):
         """В шаблон group_list корректно передаётся группа."""
         response = PostViewTests.author_client.get(PostViewTests.group_url)
@@ -236,6 +474,13 @@ class PostViewTests(TestCase):
             ).exists()
         )
 
+    def test_repeated_unfollow_redirects(self):
+        """Отписка без подписки не падает, а возвращает на профиль."""
+        response = PostViewTests.follower_client.get(
+            PostViewTests.unfollow_url
+        )
+        self.assertRedirects(response, PostViewTests.profile_url)
+
     def test_follow_page_contain_new_post_if_following(self):
         """Новая запись пользователя появляется в ленте тех, кто на него
         подписан и не появляется в ленте тех, кто не подписан."""
@@ -261,7 +506,281 @@ class PostViewTests(TestCase):
         ).delete()
 
 
+class FollowFeedTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username='Author')
+        cls.reader = User.objects.create(username='Reader')
+        cls.old_post = Post.objects.create(
+            text='Пост до подписки',
+            author=cls.author,
+        )
+        cls.reader_client = Client()
+        cls.reader_client.force_login(cls.reader)
+        cls.follow_index_url = reverse('posts:follow_index')
+
+    def feed_posts(self):
+        response = self.reader_client.get(FollowFeedTest.follow_index_url)
+        return list(response.context['page_obj'])
+
+    def test_follow_backfills_and_unfollow_prunes_feed(self):
+        """Подписка переносит в ленту прошлые посты автора, отписка
+        убирает их из ленты.
+        """
+        Follow.objects.create(
+            user=FollowFeedTest.reader,
+            author=FollowFeedTest.author,
+        )
+        self.assertEqual(self.feed_posts(), [FollowFeedTest.old_post])
+        FollowFeedTest.reader_client.get(
+            reverse(
+                'posts:profile_unfollow',
+                kwargs={'username': FollowFeedTest.author.username},
+            )
+        )
+        self.assertFalse(
+            FeedEntry.objects.filter(user=FollowFeedTest.reader).exists()
+        )
+        self.assertEqual(self.feed_posts(), [])
+
+    @override_settings(FEED_BACKFILL_LIMIT=1)
+    def test_follow_backfills_all_posts(self):
+        """Посты автора старше FEED_BACKFILL_LIMIT дописываются в ленту
+        фоновой задачей.
+        """
+        newer_post = Post.objects.create(
+            text='Пост после старого',
+            author=FollowFeedTest.author,
+        )
+        Follow.objects.create(
+            user=FollowFeedTest.reader,
+            author=FollowFeedTest.author,
+        )
+        self.assertEqual(self.feed_posts(), [newer_post])
+        run_pending()
+        self.assertEqual(
+            self.feed_posts(), [newer_post, FollowFeedTest.old_post]
+        )
+
+    def test_new_post_fans_out_to_followers(self):
+        """Новый пост записывается в ленты подписчиков автора."""
+        Follow.objects.create(
+            user=FollowFeedTest.reader,
+            author=FollowFeedTest.author,
+        )
+        new_post = Post.objects.create(
+            text='Новый пост',
+            author=FollowFeedTest.author,
+        )
+        self.assertTrue(
+            FeedEntry.objects.filter(
+                user=FollowFeedTest.reader, post=new_post
+            ).exists()
+        )
+        self.assertEqual(self.feed_posts()[0], new_post)
+
+    def test_fan_out_to_many_followers(self):
+        """Пост раскладывается по лентам, даже если подписчиков больше,
+        чем помещается в один INSERT.
+        """
+        followers = User.objects.bulk_create(
+            User(username=f'Follower_{i}') for i in range(600)
+        )
+        Follow.objects.bulk_create(
+            Follow(user=follower, author=FollowFeedTest.author)
+            for follower in User.objects.filter(
+                username__in=[follower.username for follower in followers]
+            )
+        )
+        new_post = Post.objects.create(
+            text='Пост для многих подписчиков',
+            author=FollowFeedTest.author,
+        )
+        self.assertEqual(
+            FeedEntry.objects.filter(post=new_post).count(), len(followers)
+        )
+
+    @override_settings(FEED_FANOUT_CAP=0)
+    def test_popular_author_posts_are_pulled_on_read(self):
+        """Посты популярного автора не раскладываются по лентам, но
+        показываются в ленте подписчика.
+        """
+        Follow.objects.create(
+            user=FollowFeedTest.reader,
+            author=FollowFeedTest.author,
+        )
+        new_post = Post.objects.create(
+            text='Пост популярного автора',
+            author=FollowFeedTest.author,
+        )
+        self.assertFalse(FeedEntry.objects.exists())
+        self.assertEqual(
+            self.feed_posts(), [new_post, FollowFeedTest.old_post]
+        )
+
+    @override_settings(FEED_FANOUT_CAP=1)
+    def test_author_below_cap_again_keeps_posts_in_feed(self):
+        """Посты, написанные, пока автор был популярен, остаются в ленте,
+        когда подписчиков становится меньше.
+        """
+        other = User.objects.create(username='Other')
+        for user in (FollowFeedTest.reader, other):
+            Follow.objects.create(user=user, author=FollowFeedTest.author)
+        new_post = Post.objects.create(
+            text='Пост популярного автора',
+            author=FollowFeedTest.author,
+        )
+        self.assertFalse(FeedEntry.objects.filter(post=new_post).exists())
+        Follow.objects.get(user=other, author=FollowFeedTest.author).delete()
+        run_pending()
+        self.assertEqual(
+            self.feed_posts(), [new_post, FollowFeedTest.old_post]
+        )
+        self.assertEqual(
+            FeedEntry.objects.filter(user=FollowFeedTest.reader).count(), 2
+        )
+
+
 @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ArchiveViewTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='writer')
+        cls.posts = [
+            Post.objects.create(text=f'Запись {number}', author=cls.author)
+            for number in range(5)
+        ]
+        Comment.objects.create(
+            post=cls.posts[1], author=cls.author, text='Комментарий'
+        )
+        cls.url = reverse('posts:profile_archive', args=['writer'])
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(ArchiveViewTest.author)
+
+    @mock.patch('posts.archive.ARCHIVE_CHUNK_SIZE', 2)
+    def test_jsonl_archive_streams_all_posts(self):
+        response = self.client.get(self.url)
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        posts = [json.loads(line) for line in lines]
+        self.assertEqual(
+            [post['text'] for post in posts],
+            [post.text for post in ArchiveViewTest.posts],
+        )
+        self.assertEqual(posts[1]['comments'][0]['text'], 'Комментарий')
+
+    @mock.patch('posts.archive.ARCHIVE_CHUNK_SIZE', 2)
+    def test_html_archive_is_zipped(self):
+        response = self.client.get(self.url, {'format': 'html'})
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        content = b''.join(response.streaming_content)
+        with zipfile.ZipFile(BytesIO(content)) as archive:
+            page = archive.read('writer.html').decode()
+        for post in ArchiveViewTest.posts:
+            self.assertIn(post.text, page)
+        self.assertIn('Комментарий', page)
+
+    def test_only_author_downloads_archive(self):
+        self.client.force_login(User.objects.create(username='other'))
+        response = self.client.get(self.url)
+        self.assertRedirects(
+            response, reverse('posts:profile', args=['writer'])
+        )
+
+
+class SearchViewTest(TestCase):
+    """Индекс обновляют фоновые задачи, их выполняет run_pending
+    перед каждым поиском."""
+
+    def setUp(self):
+        super().setUp()
+        self.author = User.objects.create(username='Author')
+        self.group = Group.objects.create(
+            title='Кошки',
+            slug='cats',
+            description='Всё о домашних животных',
+        )
+        self.cat_post = Post.objects.create(
+            text='Наши коты спят на подоконнике',
+            author=self.author,
+        )
+        self.mention_post = Post.objects.create(
+            text='Соседский кот гуляет сам по себе',
+            author=self.author,
+            group=self.group,
+        )
+        self.other_post = Post.objects.create(
+            text='Прогулка по осеннему лесу',
+            author=self.author,
+        )
+        self.search_url = reverse('posts:search')
+
+    def found(self, query, page=None):
+        params = {'q': query}
+        if page is not None:
+            params['page'] = page
+        run_pending()
+        response = self.client.get(self.search_url, params)
+        return list(response.context['page_obj'])
+
+    def test_search_matches_word_forms(self):
+        """Слова запроса сравниваются по основам."""
+        self.assertEqual(
+            set(self.found('котам')), {self.cat_post, self.mention_post}
+        )
+        self.assertEqual(self.found('прогулки лесные'), [])
+        self.assertEqual(self.found('осенний лес'), [self.other_post])
+
+    def test_search_matches_group_and_comments(self):
+        Comment.objects.create(
+            post=self.other_post, author=self.author, text='Видели ежей'
+        )
+        self.assertEqual(self.found('животные'), [self.mention_post])
+        self.assertEqual(self.found('ёж'), [self.other_post])
+
+    def test_text_match_ranks_above_comment_match(self):
+        Comment.objects.create(
+            post=self.other_post, author=self.author, text='А где кота носит?'
+        )
+        found = self.found('котов')
+        self.assertEqual(found[-1], self.other_post)
+        self.assertEqual(len(found), 3)
+
+    def test_index_follows_edits_and_deletes(self):
+        self.cat_post.text = 'Наши собаки спят на подоконнике'
+        self.cat_post.save()
+        self.group.description = 'Всё о пушистых'
+        self.group.save()
+        self.mention_post.delete()
+        self.assertEqual(self.found('собака'), [self.cat_post])
+        self.assertEqual(self.found('кот'), [])
+        self.assertEqual(self.found('животные'), [])
+
+    def test_search_results_are_paginated(self):
+        Post.objects.bulk_create(
+            Post(text=f'Котёнок номер {i}', author=self.author)
+            for i in range(12)
+        )
+        # bulk_create не посылает сигналы, индекс перестраивается целиком.
+        call_command('rebuild_search_index', stdout=StringIO())
+        response = self.client.get(self.search_url, {'q': 'котёнок'})
+        self.assertEqual(response.context['page_obj'].paginator.count, 12)
+        self.assertContains(response, '?q=%D0%BA%D0%BE%D1%82%D1%91%D0%BD')
+        self.assertEqual(len(self.found('котёнок', page=2)), 2)
+
+    def test_empty_query_finds_nothing(self):
+        self.assertEqual(self.found(''), [])
+        self.assertEqual(self.found('!!!'), [])
+
+
+@override_settings(SEARCH_BACKEND='index')
+class InvertedIndexSearchViewTest(SearchViewTest):
+    """Те же проверки на встроенном инвертированном индексе."""
+
+
 class PaginatorViewTest(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -343,3 +862,48 @@ class PaginatorViewTest(TestCase):
                     self.assertEqual(
                         len(response.context['page_obj']), expected
                     )
+
+    def test_cursor_pages_walk_through_all_posts(self):
+        """Переход по курсорам "Следующая" проходит все посты ровно один
+        раз, а курсор "Предыдущая" возвращает на предыдущую страницу.
+        """
+        url = reverse('posts:index')
+        response = self.client.get(url)
+        first_page = list(response.context['page_obj'])
+        self.assertIsNone(response.context['page_obj'].previous_cursor)
+        seen = list(first_page)
+        next_cursor = response.context['page_obj'].next_cursor
+        while next_cursor:
+            response = self.client.get(url, {'cursor': next_cursor})
+            page_obj = response.context['page_obj']
+            seen.extend(page_obj)
+            next_cursor = page_obj.next_cursor
+        self.assertEqual(len(seen), len(PaginatorViewTest.posts))
+        self.assertEqual(len(set(seen)), len(seen))
+        response = self.client.get(url, {'cursor': page_obj.previous_cursor})
+        self.assertEqual(list(response.context['page_obj']), seen[10:20])
+        response = self.client.get(
+            url, {'cursor': response.context['page_obj'].previous_cursor}
+        )
+        self.assertEqual(list(response.context['page_obj']), first_page)
+
+    def test_broken_cursor_shows_first_page(self):
+        """Повреждённый курсор не ломает страницу и ведёт на первую."""
+        response = self.client.get(
+            reverse('posts:index'), {'cursor': 'not-a-cursor'}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['page_obj']), 10)
+        self.assertIsNone(response.context['page_obj'].previous_cursor)
+
+    def test_cursor_with_huge_id_shows_first_page(self):
+        """Курсор с id больше 64-битного целого считается повреждённым."""
+        # a|2020-01-01T00:00:00+00:00|99999999999999999999999
+        cursor = (
+            'YXwyMDIwLTAxLTAxVDAwOjAwOjAwKzAwOjAwfDk5OTk5OTk5OTk5OTk5OTk5OTk5'
+            'OTk5'
+        )
+        response = self.client.get(reverse('posts:index'), {'cursor': cursor})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['page_obj']), 10)
+        self.assertIsNone(response.context['page_obj'].previous_cursor)
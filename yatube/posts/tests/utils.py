@@ -0,0 +1,19 @@
+from contextlib import contextmanager
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+@contextmanager
+def assert_query_budget(test_case, budget):
+    """Проверяет, что код внутри блока выполняет не больше budget
+    SQL-запросов.
+    """
+    with CaptureQueriesContext(connection) as context:
+        yield context
+    queries = '\n'.join(query['sql'] for query in context.captured_queries)
+    test_case.assertLessEqual(
+        len(context),
+        budget,
+        f'Превышен бюджет запросов ({len(context)} > {budget}):\n{queries}',
+    )
@@ -0,0 +1,81 @@
+"""Фоновая генерация миниатюр картинок постов.
+
+После сохранения поста с новой картинкой фоновая задача строит миниатюры
+всех размеров из POST_THUMBNAIL_SIZES и варианты картинки карточки для
+srcset (ширины POST_THUMBNAIL_SRCSET_WIDTHS в форматах
+POST_THUMBNAIL_SRCSET_FORMATS) и записывает их URL в Post.thumbnails.
+Шаблоны берут готовые URL вместе с постами и не трогают картинки.
+"""
+import json
+
+from django.conf import settings
+from django.utils import timezone
+from PIL import features
+from sorl.thumbnail import get_thumbnail
+
+from core.tasks import task
+
+from .caching import bump_generation, post_feeds
+from .models import Post
+
+MIME_TYPES = {'WEBP': 'image/webp', 'JPEG': 'image/jpeg'}
+
+
+def srcset_formats():
+    """POST_THUMBNAIL_SRCSET_FORMATS без WebP, если Pillow собран без него."""
+    return [
+        fmt for fmt in settings.POST_THUMBNAIL_SRCSET_FORMATS
+        if fmt != 'WEBP' or features.check('webp')
+    ]
+
+
+def build_srcset(image):
+    """Варианты картинки карточки: {MIME-тип: [[ширина, URL], ...]}."""
+    geometry, options = settings.POST_THUMBNAIL_SIZES['card']
+    card_width, card_height = (int(side) for side in geometry.split('x'))
+    options = dict(
+        options, upscale=False, quality=settings.POST_IMAGE_QUALITY
+    )
+    srcset = {}
+    for fmt in srcset_formats():
+        variants = []
+        for width in settings.POST_THUMBNAIL_SRCSET_WIDTHS:
+            height = round(card_height * width / card_width)
+            thumbnail = get_thumbnail(
+                image, f'{width}x{height}', format=fmt, **options
+            )
+            # Маленькая картинка не увеличивается: большие ширины дают
+            # тот же вариант, и он попадает в srcset один раз.
+            if variants and thumbnail.width <= variants[-1][0]:
+                break
+            variants.append([thumbnail.width, thumbnail.url])
+        srcset[MIME_TYPES.get(fmt, f'image/{fmt.lower()}')] = variants
+    return srcset
+
+
+def is_stale(post):
+    """Нет какой-то из миниатюр текущей картинки поста."""
+    urls = post.thumbnail_urls
+    names = (*settings.POST_THUMBNAIL_SIZES, 'srcset')
+    return not urls or any(name not in urls for name in names)
+
+
+@task
+def generate_thumbnails(post_id):
+    """Строит миниатюры поста и сохраняет их URL."""
+    post = Post.objects.select_related('author', 'group').filter(
+        pk=post_id
+    ).first()
+    if post is None or not post.image:
+        return
+    urls = {'source': post.image.name}
+    for name, (geometry, options) in settings.POST_THUMBNAIL_SIZES.items():
+        urls[name] = get_thumbnail(post.image, geometry, **options).url
+    urls['srcset'] = build_srcset(post.image)
+    # Картинку могли заменить, пока строились миниатюры.
+    # updated меняет версию поста, чтобы карточка взяла миниатюру.
+    updated = Post.objects.filter(pk=post_id, image=post.image.name).update(
+        thumbnails=json.dumps(urls), updated=timezone.now()
+    )
+    if updated:
+        bump_generation(*post_feeds(post))
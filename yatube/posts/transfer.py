@@ -0,0 +1,247 @@
+"""Потоковые импорт и экспорт постов в NDJSON и CSV.
+
+Строка файла - один пост: author (username автора), group (slug группы
+или пусто), text, pub_date (ISO 8601) и image (имя файла в хранилище
+медиа). Необязательное поле image_data несёт саму картинку в base64.
+Файлы читаются и пишутся построчно, память не зависит от их размера.
+
+Импорт пишет посты через bulk_create пачками, каждая в своей транзакции.
+Сигналы при этом не срабатывают, поэтому счётчики, ленты подписок,
+поисковый индекс, ссылки на файлы картинок и кэш страниц обновляются
+для пачки явно. Картинки из image_data сохраняются в хранилище поля
+Post.image под именами по содержимому.
+"""
+import base64
+import csv
+import json
+import posixpath
+import sys
+from collections import Counter
+from contextlib import contextmanager
+from itertools import islice
+
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from core.media import add_reference
+
+from . import counters, feed, search
+from .caching import bump_generation, group_feed, index_feed, profile_feed
+from .models import Group, Post, User
+
+FORMATS = ('ndjson', 'csv')
+FIELDS = ('author', 'group', 'text', 'pub_date', 'image')
+IMAGE_DATA_FIELD = 'image_data'
+DEFAULT_BATCH_SIZE = 1000
+
+
+def guess_format(path):
+    return 'csv' if path.lower().endswith('.csv') else 'ndjson'
+
+
+def read_rows(stream, fmt):
+    if fmt == 'csv':
+        # Картинка в base64 длиннее стандартного ограничения поля CSV.
+        csv.field_size_limit(sys.maxsize)
+        yield from csv.DictReader(stream)
+        return
+    for line in stream:
+        if line.strip():
+            yield json.loads(line)
+
+
+def write_rows(stream, fmt, rows, fields):
+    """Пишет строки в поток и возвращает их количество."""
+    written = 0
+    if fmt == 'csv':
+        writer = csv.DictWriter(stream, fields)
+        writer.writeheader()
+        write = writer.writerow
+    else:
+        def write(row):
+            stream.write(json.dumps(row, ensure_ascii=False) + '\n')
+    for row in rows:
+        write(row)
+        written += 1
+    return written
+
+
+def _image_field():
+    return Post._meta.get_field('image')
+
+
+def _image_data(name):
+    try:
+        with _image_field().storage.open(name) as image:
+            return base64.b64encode(image.read()).decode()
+    except FileNotFoundError:
+        return ''
+
+
+def export_rows(with_images=False, chunk_size=DEFAULT_BATCH_SIZE):
+    """Посты в порядке создания в виде словарей формата обмена."""
+    posts = Post.objects.order_by('pk').values_list(
+        'author__username', 'group__slug', 'text', 'pub_date', 'image'
+    )
+    for author, group, text, pub_date, image in posts.iterator(chunk_size):
+        row = {
+            'author': author,
+            'group': group or '',
+            'text': text,
+            'pub_date': pub_date.isoformat(),
+            'image': image,
+        }
+        if with_images:
+            row[IMAGE_DATA_FIELD] = _image_data(image) if image else ''
+        yield row
+
+
+@contextmanager
+def keep_pub_date():
+    """Отключает auto_now_add у Post.pub_date, чтобы bulk_create
+    сохранил даты из файла."""
+    field = Post._meta.get_field('pub_date')
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
+
+
+class PostImporter:
+    """Импорт постов пачками с кэшем id авторов и групп в памяти."""
+
+    def __init__(self, batch_size=DEFAULT_BATCH_SIZE, create_missing=False):
+        self.batch_size = batch_size
+        self.create_missing = create_missing
+        self.authors = {}
+        self.groups = {}
+        self.imported = 0
+        self.feeds = {index_feed()}
+
+    def run(self, rows, progress=None):
+        """Импортирует строки; progress(imported) вызывается после
+        каждой пачки. Возвращает число импортированных постов."""
+        rows = (
+            (number, self._clean(number, row))
+            for number, row in enumerate(rows, start=1)
+        )
+        last_pk = Post.objects.aggregate(last=Max('pk'))['last'] or 0
+        while True:
+            batch = list(islice(rows, self.batch_size))
+            if not batch:
+                break
+            with transaction.atomic():
+                last_pk = self._import_batch(batch, last_pk)
+            self.imported += len(batch)
+            if progress is not None:
+                progress(self.imported)
+        bump_generation(*self.feeds)
+        return self.imported
+
+    def _import_batch(self, batch, last_pk):
+        self._resolve(
+            User, 'username', self.authors, 'автор',
+            {(number, row['author']) for number, row in batch},
+        )
+        self._resolve(
+            Group, 'slug', self.groups, 'группа',
+            {(number, row['group']) for number, row in batch if row['group']},
+        )
+        posts = [self._build(number, row) for number, row in batch]
+        with keep_pub_date():
+            Post.objects.bulk_create(posts)
+        counters.add_posts_counts(Counter(post.author_id for post in posts))
+        images = Counter(post.image.name for post in posts if post.image)
+        for name, count in images.items():
+            add_reference(name, count)
+        for number, row in batch:
+            self.feeds.add(profile_feed(row['author']))
+            if row['group']:
+                self.feeds.add(group_feed(row['group']))
+        # На SQLite bulk_create не возвращает id, новые посты находятся
+        # по первичному ключу больше последнего известного.
+        created = list(
+            Post.objects.filter(pk__gt=last_pk).order_by('pk').values_list(
+                'pk', 'author_id', 'pub_date'
+            )
+        )
+        if not created:
+            return last_pk
+        feed.fan_out_posts(created)
+        search.schedule_index(post_id for post_id, _, _ in created)
+        return created[-1][0]
+
+    def _resolve(self, model, field, known, label, names):
+        """Дополняет known id объектов model по значениям поля field;
+        names - пары (номер строки, значение)."""
+        missing = {name for _, name in names if name not in known}
+        if not missing:
+            return
+        known.update(model.objects.filter(
+            **{f'{field}__in': missing}
+        ).values_list(field, 'pk'))
+        missing -= known.keys()
+        if missing and self.create_missing:
+            model.objects.bulk_create(
+                self._new_object(model, name) for name in missing
+            )
+            known.update(model.objects.filter(
+                **{f'{field}__in': missing}
+            ).values_list(field, 'pk'))
+            missing -= known.keys()
+        if missing:
+            number, name = min(
+                (number, name) for number, name in names if name in missing
+            )
+            raise ValueError(
+                f'Запись {number}: {label} «{name}» не существует'
+            )
+
+    @staticmethod
+    def _clean(number, row):
+        if not row.get('author') or row.get('text') is None:
+            raise ValueError(f'Запись {number}: нужны поля author и text')
+        row['group'] = row.get('group') or ''
+        return row
+
+    @staticmethod
+    def _new_object(model, name):
+        if model is Group:
+            return Group(slug=name, title=name, description='')
+        user = User(username=name)
+        user.set_unusable_password()
+        return user
+
+    def _build(self, number, row):
+        if row.get('pub_date'):
+            pub_date = parse_datetime(row['pub_date'])
+            if pub_date is None:
+                raise ValueError(
+                    f'Запись {number}: неверная дата «{row["pub_date"]}»'
+                )
+            if timezone.is_naive(pub_date):
+                pub_date = timezone.make_aware(pub_date)
+        else:
+            pub_date = timezone.now()
+        image = row.get('image') or ''
+        if row.get(IMAGE_DATA_FIELD):
+            field = _image_field()
+            # Имя в хранилище строится заново по содержимому в каталоге
+            # upload_to поля, от исходного остаётся расширение.
+            image = field.storage.save(
+                field.generate_filename(
+                    None, posixpath.basename(image) or 'imported'
+                ),
+                ContentFile(base64.b64decode(row[IMAGE_DATA_FIELD])),
+            )
+        return Post(
+            author_id=self.authors[row['author']],
+            group_id=self.groups.get(row['group']) if row['group'] else None,
+            text=row['text'],
+            pub_date=pub_date,
+            image=image,
+        )
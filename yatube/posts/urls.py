@@ -6,6 +6,8 @@ app_name = 'posts'
 
 urlpatterns = [
     path('', views.index, name='index'),
+    path('search/', views.search, name='search'),
+    path('personal/', views.personal, name='personal'),
     path('create/', views.post_create, name='create_post'),
     path('group/<slug:slug>/', views.group_posts, name='group_list'),
     path('posts/<int:post_id>/', views.post_detail, name='post_detail'),
@@ -16,6 +18,11 @@ urlpatterns = [
     ),
     path('posts/<int:post_id>/edit/', views.post_edit, name='post_edit'),
     path('profile/<str:username>/', views.profile, name='profile'),
+    path(
+        'profile/<str:username>/archive/',
+        views.profile_archive,
+        name='profile_archive'
+    ),
     path('follow/', views.follow_index, name='follow_index'),
     path(
         'profile/<str:username>/follow/',
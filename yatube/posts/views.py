@@ -1,13 +1,30 @@
 from django.contrib.auth.decorators import login_required
+from django.core.paginator import Paginator
+from django.db import transaction
+from django.http import JsonResponse, StreamingHttpResponse
+from django.middleware.csrf import get_token
 from django.shortcuts import get_object_or_404, redirect, render
-from django.views.decorators.cache import cache_page
+from django.urls import reverse
+from django.views.decorators.cache import never_cache
 
+from core.replicas import use_replica
+
+from . import archive
+from .caching import (cached_feed, conditional_feed, group_feed, index_feed,
+                      profile_feed, shared_page)
+from .counters import get_stats
+from .feed import FEED_DATE_FIELD, follow_feed
 from .forms import CommentForm, PostForm
 from .models import Follow, Group, Post, User
-from .utils import paginate_page
+from .search import search as search_posts
+from .utils import (DEFAULT_COMMENTS_PER_PAGE, DEFAULT_POST_PER_PAGE,
+                    paginate_page)
 
 
-@cache_page(20, key_prefix='index_page')
+@use_replica
+@shared_page
+@conditional_feed(index_feed)
+@cached_feed(index_feed)
 def index(request):
     post_list = Post.objects.all().select_related('author', 'group')
     page_obj = paginate_page(request, post_list)
@@ -15,6 +32,10 @@ def index(request):
     return render(request, 'posts/index.html', context)
 
 
+@use_replica
+@shared_page
+@conditional_feed(group_feed)
+@cached_feed(group_feed)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
     post_list = group.posts.all().select_related('author')
@@ -23,33 +44,86 @@ def group_posts(request, slug):
     return render(request, 'posts/group_list.html', context)
 
 
+@use_replica
+@shared_page
+@conditional_feed(profile_feed)
+@cached_feed(profile_feed)
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    following = (
-        request.user.is_authenticated
-        and Follow.objects.filter(user=request.user, author=author).exists()
+    author = get_object_or_404(
+        User.objects.select_related('stats'), username=username
     )
     post_list = author.posts.all().select_related('group')
     page_obj = paginate_page(request, post_list)
-    context = {'author': author, 'following': following, 'page_obj': page_obj}
+    context = {
+        'author': author,
+        'page_obj': page_obj,
+        'posts_count': get_stats(author).posts_count,
+    }
     return render(request, 'posts/profile.html', context)
 
 
+@use_replica
+def search(request):
+    query = request.GET.get('q', '').strip()
+    paginator = Paginator(search_posts(query), DEFAULT_POST_PER_PAGE)
+    page_obj = paginator.get_page(request.GET.get('page'))
+    # Поиск отдаёт id по убыванию релевантности, посты подгружаются
+    # одним запросом только для текущей страницы.
+    post_ids = list(page_obj.object_list)
+    posts = Post.objects.select_related('author', 'group').in_bulk(post_ids)
+    page_obj.object_list = [posts[pk] for pk in post_ids if pk in posts]
+    context = {'query': query, 'page_obj': page_obj}
+    return render(request, 'posts/search.html', context)
+
+
+@use_replica
+@shared_page
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
-    comments = post.comments.all()
+    post = get_object_or_404(
+        Post.objects.select_related('author__stats', 'group'), pk=post_id
+    )
+    comments = paginate_page(
+        request,
+        post.comments.select_related('author'),
+        DEFAULT_COMMENTS_PER_PAGE,
+        date_field='created',
+    )
     form = CommentForm()
     context = {'post': post, 'comments': comments, 'form': form}
     return render(request, 'posts/post_detail.html', context)
 
 
+@never_cache
+def personal(request):
+    """Данные посетителя для страниц, общих для всех: кто вошёл, токен
+    CSRF и подписка на автора из параметра author.
+    """
+    user = request.user
+    data = {
+        'authenticated': user.is_authenticated,
+        'username': user.get_username(),
+        'profile_url': '',
+        'csrf_token': get_token(request),
+        'following': None,
+    }
+    if user.is_authenticated:
+        data['profile_url'] = reverse('posts:profile', args=[user.username])
+    author = request.GET.get('author')
+    if author and author != data['username']:
+        data['following'] = user.is_authenticated and Follow.objects.filter(
+            user=user, author__username=author
+        ).exists()
+    return JsonResponse(data)
+
+
 @login_required
 def post_create(request):
     form = PostForm(request.POST or None, files=request.FILES or None)
     if form.is_valid():
         post = form.save(commit=False)
         post.author = request.user
-        post.save()
+        with transaction.atomic():
+            post.save()
         return redirect('posts:profile', request.user.username)
     context = {'form': form}
     return render(request, 'posts/create_post.html', context)
@@ -80,28 +154,53 @@ def add_comment(request, post_id):
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
-        comment.save()
+        with transaction.atomic():
+            comment.save()
     return redirect('posts:post_detail', post_id=post_id)
 
 
+@use_replica
 @login_required
 def follow_index(request):
-    post_list = Post.objects.filter(author__following__user=request.user)
-    page_obj = paginate_page(request, post_list)
+    post_list = follow_feed(request.user).select_related('author', 'group')
+    page_obj = paginate_page(request, post_list, date_field=FEED_DATE_FIELD)
     context = {'page_obj': page_obj}
     return render(request, 'posts/follow.html', context)
 
 
+@login_required
+def profile_archive(request, username):
+    """Все посты автора с комментариями: ?format=jsonl (по умолчанию)
+    или html - HTML-страница в zip."""
+    if username != request.user.username:
+        return redirect('posts:profile', username)
+    if request.GET.get('format') == 'html':
+        response = StreamingHttpResponse(
+            archive.html_zip_archive(request.user),
+            content_type='application/zip',
+        )
+        filename = f'{username}-archive.zip'
+    else:
+        response = StreamingHttpResponse(
+            archive.jsonl_archive(request.user),
+            content_type='application/x-ndjson; charset=utf-8',
+        )
+        filename = f'{username}-archive.jsonl'
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
 @login_required
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
     if author != request.user:
-        Follow.objects.get_or_create(user=request.user, author=author)
+        with transaction.atomic():
+            Follow.objects.get_or_create(user=request.user, author=author)
     return redirect('posts:profile', username=username)
 
 
 @login_required
 def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
-    Follow.objects.get(user=request.user, author=author).delete()
+    Follow.objects.filter(user=request.user, author=author).delete()
     return redirect('posts:profile', username=username)
@@ -0,0 +1,44 @@
+// Страницы отдаются одинаковыми для всех посетителей, а всё, что зависит
+// от пользователя, подставляется из ответа posts:personal.
+(function () {
+  'use strict';
+
+  var visible = {
+    anonymous: function (data) { return !data.authenticated; },
+    authenticated: function (data) { return data.authenticated; },
+    author: function (data, element) {
+      return data.authenticated && element.dataset.author === data.username;
+    },
+    following: function (data) { return data.following === true; },
+    'not-following': function (data) { return data.following === false; }
+  };
+
+  function apply(data) {
+    document.querySelectorAll('[data-personal]').forEach(function (element) {
+      var rule = visible[element.dataset.personal];
+      element.hidden = !(rule && rule(data, element));
+    });
+    document.querySelectorAll('[data-personal-username]').forEach(
+      function (element) { element.textContent = data.username; }
+    );
+    document.querySelectorAll('[data-personal-profile]').forEach(
+      function (element) {
+        element.href = data.profile_url;
+        if (window.location.pathname === data.profile_url) {
+          element.classList.add('active');
+        }
+      }
+    );
+    document.querySelectorAll('input[name="csrfmiddlewaretoken"]').forEach(
+      function (element) {
+        if (!element.value) {
+          element.value = data.csrf_token;
+        }
+      }
+    );
+  }
+
+  fetch(document.body.dataset.personalUrl, {credentials: 'same-origin'})
+    .then(function (response) { return response.json(); })
+    .then(apply);
+}());
@@ -48,16 +48,20 @@ INSTALLED_APPS = [
     'users.apps.UsersConfig',
     'core.apps.CoreConfig',
     'about.apps.AboutConfig',
+    'api.apps.ApiConfig',
+    'notifications.apps.NotificationsConfig',
     'sorl.thumbnail',
     'debug_toolbar',
 ]
 
 MIDDLEWARE = [
+    'core.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware.ReplicaMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'debug_toolbar.middleware.DebugToolbarMiddleware',
@@ -67,13 +71,20 @@ INTERNAL_IPS = [
     '127.0.0.1',
 ]
 
+# Доля запросов, для которых собираются метрики (0 - выключено).
+METRICS_SAMPLE_RATE = 0.1
+# Страница /metrics/ доступна персоналу сайта, а сборщику метрик -
+# с заголовком Authorization: Bearer <METRICS_TOKEN>, если токен задан.
+# Адрес клиента не проверяется: за прокси все запросы идут с 127.0.0.1.
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
 ROOT_URLCONF = 'yatube.urls'
 
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.template_backends.InstrumentedDjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -94,12 +105,54 @@ WSGI_APPLICATION = 'yatube.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
+# Параметры базы берутся из переменных окружения DB_*, по умолчанию -
+# SQLite-файл в BASE_DIR. Соединение потока переиспользуется между
+# запросами DB_CONN_MAX_AGE секунд (0 - закрывать после каждого запроса).
+# DB_POOLER=pgbouncer отключает серверные курсоры, которые не работают
+# за пулом соединений PgBouncer в режиме транзакций.
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'ENGINE': os.getenv('DB_ENGINE', 'django.db.backends.sqlite3'),
+        'NAME': os.getenv('DB_NAME', os.path.join(BASE_DIR, 'db.sqlite3')),
+        'USER': os.getenv('DB_USER', ''),
+        'PASSWORD': os.getenv('DB_PASSWORD', ''),
+        'HOST': os.getenv('DB_HOST', ''),
+        'PORT': os.getenv('DB_PORT', ''),
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', 60)),
+        'DISABLE_SERVER_SIDE_CURSORS': os.getenv('DB_POOLER') == 'pgbouncer',
     }
 }
+# Реплики для чтения: DB_REPLICAS - хосты реплик через запятую (для SQLite -
+# пути к копиям файла базы). После записи клиент читает из основной базы
+# DB_REPLICA_STICKY_SECONDS секунд - не меньше отставания реплик.
+DATABASE_REPLICAS = []
+for number, location in enumerate(
+    filter(None, os.getenv('DB_REPLICAS', '').split(',')), start=1
+):
+    replica = {**DATABASES['default'], 'TEST': {'MIRROR': 'default'}}
+    if 'sqlite' in replica['ENGINE']:
+        replica['NAME'] = location.strip()
+    else:
+        replica['HOST'] = location.strip()
+    DATABASES[f'replica_{number}'] = replica
+    DATABASE_REPLICAS.append(f'replica_{number}')
+DATABASE_ROUTERS = ['core.replicas.ReplicaRouter']
+DB_REPLICA_STICKY_SECONDS = int(os.getenv('DB_REPLICA_STICKY_SECONDS', 10))
+DB_REPLICA_STICKY_COOKIE = 'db_primary'
+# Проверять переиспользуемые соединения в начале запроса и закрывать
+# оборвавшиеся, чтобы запрос не упал на мёртвом соединении.
+DB_CONN_HEALTH_CHECKS = os.getenv('DB_CONN_HEALTH_CHECKS', '1') == '1'
+# PRAGMA для каждого нового соединения SQLite. В режиме WAL читатели
+# не ждут пишущие транзакции; synchronous=NORMAL в WAL безопасен при
+# сбое процесса; cache_size < 0 - размер кэша в КиБ.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL'),
+    'busy_timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT', 5000)),
+    'cache_size': int(os.getenv('SQLITE_CACHE_SIZE', -64000)),
+    'mmap_size': int(os.getenv('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+    'temp_store': 'MEMORY',
+}
 
 
 # Password validation
@@ -141,11 +194,45 @@ STATICFILES_DIRS = [
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
-
+# Картинки постов хранятся под именами по содержимому (core.storage)
+# и отдаются с Cache-Control: immutable на MEDIA_IMMUTABLE_MAX_AGE секунд.
+MEDIA_IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+# Файл без ссылок удаляется не раньше чем через MEDIA_GC_GRACE секунд:
+# за это время его может подхватить новая загрузка или незакоммиченный пост.
+MEDIA_GC_GRACE = 60 * 60
+
+# Кэш в два уровня: небольшой LRU в памяти процесса (core.cache) перед
+# общим для всех процессов кэшем. Общий кэш - Redis, если задан
+# CACHE_REDIS_URL (нужен django-redis), иначе файлы в CACHE_DIR
+# с атомарным add для блокировок между процессами.
+# Размер обоих уровней ограничен, локальные копии живут не дольше
+# CACHE_L1_TIMEOUT секунд.
+CACHE_REDIS_URL = os.getenv('CACHE_REDIS_URL')
+if CACHE_REDIS_URL:
+    SHARED_CACHE = {
+        'BACKEND': 'django_redis.cache.RedisCache',
+        'LOCATION': CACHE_REDIS_URL,
+    }
+else:
+    SHARED_CACHE = {
+        'BACKEND': 'core.cache.FileBasedCache',
+        'LOCATION': os.getenv('CACHE_DIR', os.path.join(BASE_DIR, 'cache')),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', 10000)),
+        },
+    }
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+        'BACKEND': 'core.cache.TieredCache',
+        'LOCATION': 'default',
+        'OPTIONS': {
+            'SHARED': 'shared',
+            'L1_MAX_ENTRIES': int(os.getenv('CACHE_L1_MAX_ENTRIES', 1000)),
+            'L1_TIMEOUT': int(os.getenv('CACHE_L1_TIMEOUT', 5)),
+            'TIMEOUT_JITTER': 0.1,
+        },
+    },
+    'shared': SHARED_CACHE,
 }
 
 LOGIN_URL = 'users:login'
@@ -153,6 +240,84 @@ LOGIN_REDIRECT_URL = 'posts:index'
 # LOGOUT_REDIRECT_URL = 'posts:index'
 
 #  подключаем движок filebased.EmailBackend
-EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
+EMAIL_BACKEND = os.getenv(
+    'EMAIL_BACKEND', 'django.core.mail.backends.filebased.EmailBackend'
+)
 # указываем директорию, в которую будут складываться файлы писем
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
+# Для SMTP: EMAIL_BACKEND=django.core.mail.backends.smtp.EmailBackend.
+EMAIL_HOST = os.getenv('EMAIL_HOST', 'localhost')
+EMAIL_PORT = int(os.getenv('EMAIL_PORT', 25))
+EMAIL_HOST_USER = os.getenv('EMAIL_HOST_USER', '')
+EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD', '')
+EMAIL_USE_TLS = os.getenv('EMAIL_USE_TLS') == '1'
+DEFAULT_FROM_EMAIL = os.getenv('DEFAULT_FROM_EMAIL', 'webmaster@localhost')
+# Адрес сайта для ссылок в письмах.
+SITE_URL = os.getenv('SITE_URL', 'http://localhost:8000')
+
+# Дайджесты новых постов из подписок (notifications.digests): писем
+# в одной пачке, постов в письме и сколько дней хранятся события.
+DIGEST_BATCH_SIZE = 500
+DIGEST_MAX_POSTS = 20
+DIGEST_RETENTION_DAYS = 7
+
+# Лента подписок материализуется при публикации поста. Посты авторов,
+# у которых подписчиков больше FEED_FANOUT_CAP, не раскладываются по лентам
+# и подтягиваются при чтении.
+FEED_FANOUT_CAP = 5000
+# Сколько последних постов автора попадает в ленту сразу при подписке;
+# остальные дописывает фоновая задача.
+FEED_BACKFILL_LIMIT = 500
+FEED_BATCH_SIZE = 1000
+
+# Страницы лент живут в кэше до смены поколения ленты, но не дольше
+# FEED_CACHE_TIMEOUT секунд.
+FEED_CACHE_TIMEOUT = 60 * 60
+FEED_CACHE_LOCK_TIMEOUT = 10
+# Сколько секунд CDN может отдавать общие для всех страницы лент и постов
+# без обращения к приложению.
+EDGE_CACHE_TIMEOUT = int(os.getenv('EDGE_CACHE_TIMEOUT', 60))
+# Посты в ответах пакетного запроса API кэшируются по версии поста.
+API_POST_CACHE_TIMEOUT = 60 * 60
+# Карточки постов в лентах кэшируются по версии поста (Post.updated).
+POST_CARD_CACHE_TIMEOUT = 24 * 60 * 60
+
+# Загруженные картинки постов перекодируются (posts.images): большая
+# сторона не длиннее POST_IMAGE_MAX_SIDE пикселей, формат 'WEBP' или
+# 'JPEG' и качество сжатия.
+POST_IMAGE_MAX_SIDE = 2048
+POST_IMAGE_FORMAT = 'WEBP'
+POST_IMAGE_QUALITY = 80
+
+# Миниатюры картинок постов: имя размера -> (геометрия sorl, опции).
+# Генерируются фоновой задачей после сохранения поста, шаблоны берут
+# готовые URL.
+POST_THUMBNAIL_SIZES = {
+    'card': ('960x339', {'crop': 'center', 'upscale': True}),
+}
+# Варианты картинки карточки для srcset: ширины в пикселях и форматы
+# в порядке предпочтения. Пропорции берутся у размера 'card', картинка
+# не увеличивается, поэтому у маленьких картинок вариантов меньше.
+POST_THUMBNAIL_SRCSET_WIDTHS = (320, 640, 960, 1280)
+POST_THUMBNAIL_SRCSET_FORMATS = ('WEBP', 'JPEG')
+
+# Поиск по постам: 'fts5' - полнотекстовая таблица SQLite FTS5,
+# 'index' - встроенный инвертированный индекс, 'auto' - FTS5, если есть.
+SEARCH_BACKEND = 'auto'
+
+# Фоновые задачи (core.tasks) выполняет команда run_workers. При
+# TASKS_EAGER=1 задачи выполняются сразу после коммита без воркеров.
+TASKS_EAGER = os.getenv('TASKS_EAGER') == '1'
+TASKS_WORKER_PROCESSES = int(os.getenv('TASKS_WORKER_PROCESSES', 1))
+TASKS_WORKER_THREADS = int(os.getenv('TASKS_WORKER_THREADS', 4))
+# Сколько задач воркер забирает за раз и как часто проверяет очередь.
+TASKS_BATCH_SIZE = 10
+TASKS_POLL_INTERVAL = 1.0
+# Попытки упавшей задачи: задержка удваивается от TASKS_RETRY_DELAY
+# до TASKS_RETRY_MAX_DELAY секунд.
+TASKS_MAX_ATTEMPTS = 5
+TASKS_RETRY_DELAY = 10
+TASKS_RETRY_MAX_DELAY = 60 * 60
+# Через сколько секунд задача воркера, не отчитавшегося о ней,
+# возвращается в очередь.
+TASKS_LOCK_TIMEOUT = 10 * 60
@@ -3,15 +3,19 @@ from django.urls import include, path
 from django.conf import settings
 from django.conf.urls.static import static
 
+from core.views import metrics, serve_media
+
 handler403 = 'core.views.csrf_failure'
 handler404 = 'core.views.page_not_found'
 
 urlpatterns = [
     path('', include('posts.urls', namespace='posts')),
     path('about/', include('about.urls', namespace='about')),
+    path('api/v1/', include('api.urls', namespace='api')),
     path('admin/', admin.site.urls),
     path('auth/', include('users.urls', namespace='users')),
     path('auth/', include('django.contrib.auth.urls')),
+    path('metrics/', metrics, name='metrics'),
 ]
 
 if settings.DEBUG:
@@ -19,5 +23,7 @@ if settings.DEBUG:
 
     urlpatterns += (path('__debug__/', include(debug_toolbar.urls)),)
     urlpatterns += static(
-        settings.MEDIA_URL, document_root=settings.MEDIA_ROOT
+        settings.MEDIA_URL,
+        view=serve_media,
+        document_root=settings.MEDIA_ROOT,
     )